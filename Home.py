@@ -1,7 +1,9 @@
 import streamlit as st
-from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+import course_catalog
+import database
+import enrollment_index
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +14,7 @@ if not CONNECTION_STRING:
     st.error("MongoDB connection string not found. Please set it in the .env file.")
     st.stop()
 
-client = MongoClient(CONNECTION_STRING)
+client = database.get_client()
 
 # Databases and collections
 master_db = client["master_db"]
@@ -47,27 +49,22 @@ if st.button("Quiz", key="quiz_button"):
 
 def get_enrolled_courses(student_id):
     """Fetch enrolled courses based on course IDs."""
-    student = students_collection.find_one({"student_id": student_id})
+    student = students_collection.find_one(
+        {"student_id": student_id},
+        {"_id": 0, "enrolled_courses": 1}
+    )
     if not student:
         return []
 
     course_ids = student.get("enrolled_courses", [])
-    courses = []
-
-    for course_id in course_ids:
-        course = courses_collection.find_one({"course_id": course_id})
-        if course:
-            courses.append((course_id, course["course_name"]))
-
-    return courses
+    return course_catalog.get_course_names(courses_collection, course_ids)
 
 def enroll_in_course(student_id, course_id):
     """Enroll a student in a course using course_id and push to subj DB."""
-    course = courses_collection.find_one({"course_id": course_id})
-    if not course:
+    course_name = course_catalog.get_course_name(courses_collection, course_id)
+    if not course_name:
         return None  # Invalid course ID
 
-    course_name = course["course_name"]
     student = students_collection.find_one({"student_id": student_id})
 
     if not student:
@@ -91,6 +88,8 @@ def enroll_in_course(student_id, course_id):
     if not enroll_stud_collection.find_one({"student_id": student_id}):
         enroll_stud_collection.insert_one({"student_id": student_id})
 
+    enrollment_index.record_enrollment(client, student_id, course_name.lower())
+
     return course_name
 
 # Sidebar: Display enrolled courses
@@ -106,6 +105,14 @@ if enrolled_courses:
 else:
     st.sidebar.write("You are not enrolled in any courses.")
 
+cache_stats = course_catalog.cache_stats()
+st.sidebar.caption(
+    f"Course cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+    f"({cache_stats['size']}/{cache_stats['maxsize']} entries)"
+)
+pool = database.pool_stats()
+st.sidebar.caption(f"DB pool: {pool['in_use']} in use / {pool['open']} open")
+
 # Display welcome message if a course is selected
 if "active_course" in st.session_state:
     st.title(f"Hello, welcome to '{st.session_state['active_course']}' course! 🎓")
@@ -0,0 +1,266 @@
+"""Figures for the student analysis page.
+
+Each builder returns a Plotly figure sized for what the chart can show:
+time series are downsampled with Largest-Triangle-Three-Buckets (LTTB) to
+`ANALYSIS_MAX_POINTS` points, the heatmap averages runs of days down to
+`ANALYSIS_HEATMAP_ROWS` rows and drops its cell labels once there are too
+many cells to read, the comparison chart has one bar per quiz, and
+mastery gauges are drawn a page at a time.
+
+`figure_spec` caches a figure's serialized spec in a process-wide LRU keyed
+by the history version from `analysis_frames` plus the page's filters, so
+reruns that do not change the data (tab switches, other widgets) reuse the
+spec instead of rebuilding the figure.
+"""
+import math
+import os
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from cache import TTLCache
+
+MAX_POINTS = int(os.getenv("ANALYSIS_MAX_POINTS", "800"))
+GAUGES_PER_PAGE = int(os.getenv("ANALYSIS_GAUGES_PER_PAGE", "6"))
+GAUGE_COLUMNS = 3
+HEATMAP_MAX_ROWS = int(os.getenv("ANALYSIS_HEATMAP_ROWS", "120"))
+HEATMAP_LABELLED_CELLS = 400
+MASTERY_THRESHOLD = 90  # 90% accuracy considered mastery
+
+CATEGORY_COLORS = {
+    "Needs Improvement": "#ff6b6b",
+    "Satisfactory": "#ffd166",
+    "Good": "#4ecdc4",
+    "Excellent": "#06d6a0"
+}
+
+_specs = TTLCache(
+    maxsize=int(os.getenv("ANALYSIS_FIGURE_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("ANALYSIS_FIGURE_CACHE_TTL", "3600")),
+)
+
+
+def figure_spec(key, build):
+    """Return the cached spec for key, building the figure with build() on a miss."""
+    spec = _specs.get(key)
+    if spec is None:
+        spec = build().to_dict()
+        _specs.set(key, spec)
+    return spec
+
+
+def cache_stats():
+    return _specs.stats()
+
+
+def lttb(x, y, threshold=MAX_POINTS):
+    """Indexes of the points Largest-Triangle-Three-Buckets keeps out of (x, y)."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    bucket = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        kept[i + 1] = previous
+    return kept
+
+
+def progression_figure(df):
+    kept = df.iloc[lttb(df["timestamp"].astype("int64"), df["score"])]
+    markers = len(kept) <= 100
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=kept["timestamp"],
+        y=kept["score"],
+        mode='lines+markers' if markers else 'lines',
+        name='Score',
+        line=dict(color='#4e54c8', width=3),
+        marker=dict(size=8)
+    ))
+    fig.add_trace(go.Scatter(
+        x=kept["timestamp"],
+        y=kept["total"],
+        mode='lines',
+        name='Total Possible',
+        line=dict(color='#8f94fb', width=2, dash='dash')
+    ))
+    title = 'Score Progression Over Time'
+    if len(kept) < len(df):
+        title += f' ({len(kept):,} of {len(df):,} attempts shown)'
+    fig.update_layout(
+        title=title,
+        height=400,
+        hovermode='x unified',
+        legend=dict(orientation='h', y=1.1),
+        xaxis=dict(
+            rangeslider=dict(visible=True),
+            type='date'
+        )
+    )
+    return fig
+
+
+def category_figure(category_counts):
+    colors = [CATEGORY_COLORS.get(cat, "#000000") for cat in category_counts["Category"]]
+    fig = go.Figure(data=[go.Pie(
+        labels=category_counts["Category"],
+        values=category_counts["Count"],
+        hole=.3,
+        marker=dict(colors=colors),
+        textinfo='label+percent',
+        hoverinfo='label+value',
+        textfont=dict(size=14)
+    )])
+    fig.update_layout(
+        title="Performance Categories Distribution",
+        height=400
+    )
+    return fig
+
+
+def _bucket_rows(quiz_pivot, max_rows):
+    """Average runs of consecutive days so the heatmap has at most max_rows rows."""
+    size = math.ceil(len(quiz_pivot) / max_rows)
+    if size <= 1:
+        return quiz_pivot
+    groups = np.arange(len(quiz_pivot)) // size
+    bucketed = quiz_pivot.groupby(groups).mean()
+    bucketed.index = [f"{day} (+{size - 1} d)" for day in quiz_pivot.index[::size]]
+    return bucketed
+
+
+def heatmap_figure(quiz_pivot):
+    """Mean accuracy per day and quiz; days with no attempt at a quiz show as 0."""
+    quiz_pivot = _bucket_rows(quiz_pivot, HEATMAP_MAX_ROWS).fillna(0)
+    fig = px.imshow(
+        quiz_pivot.round(1),
+        labels=dict(x="Quiz ID", y="Date", color="Accuracy %"),
+        x=quiz_pivot.columns,
+        y=quiz_pivot.index,
+        color_continuous_scale="Blues",
+        aspect="auto",
+        text_auto=quiz_pivot.size <= HEATMAP_LABELLED_CELLS
+    )
+    fig.update_layout(
+        height=400,
+        xaxis=dict(side="top")
+    )
+    return fig
+
+
+def comparison_figure(quiz_stats, avg_accuracy):
+    """Mean accuracy per quiz, with the overall average as a dashed line."""
+    fig = px.bar(
+        quiz_stats.round({"average": 1}),
+        x="quiz_id",
+        y="average",
+        color="average",
+        color_continuous_scale=["red", "yellow", "green"],
+        range_color=[0, 100],
+        labels={"average": "Accuracy (%)", "quiz_id": "Quiz ID", "attempts": "Attempts"},
+        text=quiz_stats["average"].map("{:.0f}%".format),
+        hover_data=["attempts"]
+    )
+    fig.update_layout(
+        height=400,
+        xaxis_title="Quiz ID",
+        yaxis_title="Accuracy (%)",
+        yaxis=dict(range=[0, 100]),
+        hovermode="closest"
+    )
+    fig.add_shape(
+        type="line",
+        x0=-0.5,
+        y0=avg_accuracy,
+        x1=len(quiz_stats) - 0.5,
+        y1=avg_accuracy,
+        line=dict(
+            color="black",
+            width=2,
+            dash="dash",
+        ),
+        name="Average"
+    )
+    fig.add_annotation(
+        x=len(quiz_stats) - 1,
+        y=avg_accuracy,
+        text=f"Average: {avg_accuracy:.1f}%",
+        showarrow=False,
+        yshift=10
+    )
+    return fig
+
+
+def daily_figure(daily):
+    daily = daily.iloc[lttb(daily["timestamp"].astype("int64"), daily["accuracy"])]
+    fig = px.line(
+        daily,
+        x="timestamp",
+        y="accuracy",
+        markers=len(daily) <= 100,
+        labels={"timestamp": "Date", "accuracy": "Average Accuracy (%)"},
+        title="Daily Average Performance"
+    )
+    fig.update_layout(height=300)
+    return fig
+
+
+def gauge_pages(quiz_count):
+    return max(1, math.ceil(quiz_count / GAUGES_PER_PAGE))
+
+
+def gauge_figure(quiz_stats, page):
+    """Mastery gauges for one page (1-based) of quizzes."""
+    shown = quiz_stats.iloc[(page - 1) * GAUGES_PER_PAGE:page * GAUGES_PER_PAGE]
+    columns = min(GAUGE_COLUMNS, len(shown))
+    rows = max(1, math.ceil(len(shown) / GAUGE_COLUMNS))
+
+    fig = go.Figure()
+    for i, row in enumerate(shown.itertuples()):
+        fig.add_trace(go.Indicator(
+            mode="gauge+number",
+            value=row.last_accuracy,
+            domain={'row': i // GAUGE_COLUMNS, 'column': i % GAUGE_COLUMNS},
+            title={'text': f"Quiz: {row.quiz_id}"},
+            gauge={
+                'axis': {'range': [0, 100]},
+                'bar': {'color': "darkblue"},
+                'steps': [
+                    {'range': [0, 60], 'color': "#ff6b6b"},
+                    {'range': [60, 75], 'color': "#ffd166"},
+                    {'range': [75, 90], 'color': "#4ecdc4"},
+                    {'range': [90, 100], 'color': "#06d6a0"}
+                ],
+                'threshold': {
+                    'line': {'color': "red", 'width': 4},
+                    'thickness': 0.75,
+                    'value': MASTERY_THRESHOLD
+                }
+            }
+        ))
+    fig.update_layout(
+        grid={'rows': rows, 'columns': max(1, columns)},
+        height=300 * rows,
+        title_text=f"Progress Towards Mastery ({MASTERY_THRESHOLD}%)"
+    )
+    return fig
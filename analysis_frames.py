@@ -0,0 +1,295 @@
+"""Process-wide cache of students' score histories as analysis DataFrames.
+
+The analysis page reruns on every widget change. Instead of querying and
+rebuilding the student's history each time, it asks `get_frame_cache()` for
+the prepared frame of (subject, student), which is shared by every session
+in the process. Each entry keeps a watermark, the (timestamp, _id) of its
+newest row: a refresh fetches only documents after it and appends them.
+When the caller passes the attempt count from the student's rollup, an
+entry whose count still matches is returned without touching Mongo, and a
+count that the appended rows do not explain (a score written late with an
+older timestamp, or deleted scores) triggers a full reload.
+
+A caller that cannot wait for a cold load passes `wait=False`: the history
+is then fetched in a background thread and `get` returns (None, None)
+until it is cached. The analysis page aggregates in MongoDB meanwhile
+(`score_analytics.dashboard`), so a student's first visit is not held up
+by fetching their whole history.
+
+Entries are evicted least recently used first once the frames together use
+more than `ANALYSIS_CACHE_MB`. Frames are replaced, never modified, when
+rows are appended, so callers must treat them as read-only.
+
+Date and quiz filters and the chart aggregates then run on the cached frame
+in memory (`filter_frame`, `summarize`). `quiz_id` is categorical, so the
+aggregates can group rows by integer quiz codes and day numbers.
+"""
+import itertools
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING
+
+import score_analytics
+from score_analytics import RECENT_ATTEMPTS, SATISFACTORY_ACCURACY
+
+BUDGET_BYTES = int(float(os.getenv("ANALYSIS_CACHE_MB", "256")) * 1024 * 1024)
+HEATMAP_QUIZZES = int(os.getenv("ANALYSIS_HEATMAP_QUIZZES", "30"))
+# Longer histories are aggregated in MongoDB (score_analytics.dashboard) instead of cached here
+MAX_ROWS = int(os.getenv("ANALYSIS_FRAME_MAX_ROWS", "50000"))
+COLUMNS = ["_id", "quiz_id", "score", "total", "accuracy", "timestamp"]
+
+# Versions are unique across entries and evictions, so a version never names two different frames
+_versions = itertools.count(1)
+
+
+def _prepare(rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["quiz_id"] = pd.Categorical(df["quiz_id"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df["accuracy"] = df["accuracy"].astype(float)
+    df["performance_category"] = score_analytics.categorize(df["accuracy"])
+    return df
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frame = None
+        self.version = None
+        self.expected_rows = None
+        self.nbytes = 0
+        self.loading = False
+
+
+class AnalysisFrameCache:
+    def __init__(self, budget_bytes=BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {
+            "hits": 0, "refreshes": 0, "appended_rows": 0, "full_loads": 0, "background_loads": 0, "evictions": 0
+        }
+
+    def get(self, client, subject, student_id, expected_rows=None, wait=True):
+        """Return (frame, version) for a student's history; versions are unique in the process and change with the rows.
+
+        With wait=False a history that is not cached yet is loaded in a
+        background thread, and (None, None) is returned until it is.
+        """
+        key = (subject, student_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._entries.move_to_end(key)
+            cold = not wait and entry.frame is None
+            start = cold and not entry.loading
+            entry.loading = entry.loading or cold
+        if cold:
+            if start:
+                self._count("background_loads")
+                threading.Thread(
+                    target=self._load, args=(client, subject, student_id, expected_rows, entry), daemon=True
+                ).start()
+            return None, None
+
+        with entry.lock:
+            if entry.frame is not None and expected_rows is not None and expected_rows == entry.expected_rows:
+                self._count("hits")
+            elif entry.frame is not None and self._append_new(client, subject, student_id, entry, expected_rows):
+                self._count("refreshes")
+            else:
+                entry.frame = _prepare(self._fetch(client, subject, student_id))
+                entry.version = next(_versions)
+                self._count("full_loads")
+            entry.expected_rows = expected_rows
+            frame, version = entry.frame, entry.version
+            nbytes = entry.nbytes = int(frame.memory_usage(deep=True).sum())
+
+        self._evict(key, nbytes)
+        return frame, version
+
+    def _load(self, client, subject, student_id, expected_rows, entry):
+        try:
+            self.get(client, subject, student_id, expected_rows)
+        finally:
+            entry.loading = False
+
+    def _fetch(self, client, subject, student_id, after=None):
+        query = {"student_id": student_id}
+        if after is not None:
+            timestamp, last_id = after
+            query["$or"] = [{"timestamp": {"$gt": timestamp}}, {"timestamp": timestamp, "_id": {"$gt": last_id}}]
+        collection = score_analytics.get_scores_collection(client, subject)
+        return list(collection.aggregate([
+            {"$match": query},
+            {"$sort": {"timestamp": ASCENDING, "_id": ASCENDING}},
+            {"$project": {"quiz_id": 1, "score": 1, "total": 1, "timestamp": 1, "accuracy": score_analytics.ACCURACY}},
+        ]))
+
+    def _append_new(self, client, subject, student_id, entry, expected_rows):
+        """Append documents after the watermark; False if the frame still does not match expected_rows."""
+        frame = entry.frame
+        after = None
+        if len(frame):
+            newest = frame.iloc[-1]
+            after = (newest["timestamp"].to_pydatetime(), newest["_id"])
+        rows = self._fetch(client, subject, student_id, after)
+        if expected_rows is not None and len(frame) + len(rows) != expected_rows:
+            return False
+        if rows:
+            new = _prepare(rows)
+            # Both sides need the same categories for concat to keep quiz_id categorical
+            quizzes = frame["quiz_id"].cat.categories.union(new["quiz_id"].cat.categories)
+            frame = frame.assign(quiz_id=frame["quiz_id"].cat.set_categories(quizzes))
+            new["quiz_id"] = new["quiz_id"].cat.set_categories(quizzes)
+            entry.frame = pd.concat([frame, new], ignore_index=True)
+            entry.version = next(_versions)
+            self._count("appended_rows", len(rows))
+        return True
+
+    def _evict(self, keep, keep_bytes):
+        with self._lock:
+            total = sum(entry.nbytes for entry in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.budget_bytes:
+                    break
+                if key == keep and keep_bytes <= self.budget_bytes:
+                    continue
+                total -= self._entries.pop(key).nbytes
+                self._counts["evictions"] += 1
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                "entries": len(self._entries),
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+            }
+
+
+_frame_cache = None
+_frame_cache_lock = threading.Lock()
+
+
+def get_frame_cache():
+    global _frame_cache
+    if _frame_cache is None:
+        with _frame_cache_lock:
+            if _frame_cache is None:
+                _frame_cache = AnalysisFrameCache()
+    return _frame_cache
+
+
+def filter_frame(frame, start_date=None, end_date=None, quiz_ids=None):
+    """Rows between two dates (inclusive) and in the given quizzes."""
+    mask = np.ones(len(frame), dtype=bool)
+    if start_date is not None and end_date is not None:
+        days = frame["timestamp"].to_numpy().astype("datetime64[D]")
+        mask &= (days >= np.datetime64(start_date, "D")) & (days <= np.datetime64(end_date, "D"))
+    if quiz_ids:
+        mask &= frame["quiz_id"].isin(quiz_ids).to_numpy()
+    return frame[mask]
+
+
+def _means(sums, counts):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def summarize(df, heatmap_quizzes=HEATMAP_QUIZZES):
+    """The chart aggregates for a filtered frame: summary, categories, heatmap, daily and per-quiz.
+
+    Rows are grouped once into (day, quiz) cells using integer day numbers
+    and the quiz categorical's codes; the heatmap, daily means and per-quiz
+    figures are all sums over those cells. The heatmap keeps the
+    heatmap_quizzes most attempted quizzes and folds the rest into "other".
+    """
+    accuracy = df["accuracy"].to_numpy(dtype=float)
+    scored = ~np.isnan(accuracy)
+    values = np.where(scored, accuracy, 0.0)
+    below = scored & (values < SATISFACTORY_ACCURACY)
+    quiz_names = df["quiz_id"].cat.categories
+    quiz_codes = df["quiz_id"].cat.codes.to_numpy().astype(np.int64)
+    day_numbers = df["timestamp"].to_numpy().astype("datetime64[D]").astype(np.int64)
+
+    # One pass over the rows: (day, quiz) cell of each row, then per-cell sums
+    cell_keys, cell_of_row = np.unique(day_numbers * len(quiz_names) + quiz_codes, return_inverse=True)
+    cell_rows = np.bincount(cell_of_row, minlength=len(cell_keys))
+    cell_count = np.bincount(cell_of_row, weights=scored, minlength=len(cell_keys))
+    cell_sum = np.bincount(cell_of_row, weights=values, minlength=len(cell_keys))
+    cell_below = np.bincount(cell_of_row, weights=below, minlength=len(cell_keys))
+    cell_below_sum = np.bincount(cell_of_row, weights=np.where(below, values, 0.0), minlength=len(cell_keys))
+    cell_days, cell_quizzes = np.divmod(cell_keys, max(len(quiz_names), 1))
+
+    # Per quiz: sums over that quiz's cells
+    def per_quiz(weights):
+        return np.bincount(cell_quizzes, weights=weights, minlength=len(quiz_names))
+
+    quiz_rows = per_quiz(cell_rows)
+    quiz_count, quiz_sum = per_quiz(cell_count), per_quiz(cell_sum)
+    quiz_below, quiz_below_sum = per_quiz(cell_below), per_quiz(cell_below_sum)
+    last_row = np.full(len(quiz_names), -1)
+    np.maximum.at(last_row, quiz_codes[scored], np.flatnonzero(scored))
+    last_accuracy = np.full(len(quiz_names), np.nan)
+    last_accuracy[last_row >= 0] = accuracy[last_row[last_row >= 0]]
+    observed = np.flatnonzero(quiz_rows)
+    quizzes = pd.DataFrame({
+        "quiz_id": quiz_names[observed],
+        "attempts": quiz_rows[observed].astype(int),
+        "average": _means(quiz_sum, quiz_count)[observed],
+        "last_accuracy": last_accuracy[observed],
+        "below_attempts": quiz_below[observed].astype(int),
+        "below_average": _means(quiz_below_sum, quiz_below)[observed],
+    })
+
+    # Per day: sums over that day's cells
+    days, day_of_cell = np.unique(cell_days, return_inverse=True)
+    day_count = np.bincount(day_of_cell, weights=cell_count, minlength=len(days))
+    day_sum = np.bincount(day_of_cell, weights=cell_sum, minlength=len(days))
+    has_scores = day_count > 0
+    daily = pd.DataFrame({
+        "timestamp": days[has_scores].astype("datetime64[D]").astype("datetime64[ns]"),
+        "accuracy": day_sum[has_scores] / day_count[has_scores],
+    })
+
+    # Heatmap columns: the most attempted quizzes, then everything else as "other"
+    top = observed[np.argsort(-quiz_rows[observed], kind="stable")[:heatmap_quizzes]]
+    top = np.sort(top)
+    column_of_quiz = np.full(len(quiz_names), len(top))
+    column_of_quiz[top] = np.arange(len(top))
+    columns = list(quiz_names[top]) + (["other"] if len(observed) > len(top) else [])
+    cell_columns = column_of_quiz[cell_quizzes]
+    shape = (len(days), len(columns))
+    matrix_count = np.zeros(shape)
+    matrix_sum = np.zeros(shape)
+    np.add.at(matrix_count, (day_of_cell, cell_columns), cell_count)
+    np.add.at(matrix_sum, (day_of_cell, cell_columns), cell_sum)
+    heatmap = pd.DataFrame(
+        _means(matrix_sum, matrix_count),
+        index=pd.Index(np.datetime_as_string(days.astype("datetime64[D]"), unit="D"), name="timestamp"),
+        columns=pd.Index(columns, name="quiz_id"),
+    )
+
+    counts = df["performance_category"].value_counts()
+    categories = counts[counts > 0].rename_axis("Category").reset_index(name="Count")
+
+    summary = {
+        "attempts": len(df),
+        "average": values.sum() / scored.sum() if scored.any() else None,
+        "first_accuracy": accuracy[0] if len(df) else None,
+        "last_accuracy": accuracy[-1] if len(df) else None,
+        "quiz_count": len(observed),
+        "recent_average": df["accuracy"].tail(RECENT_ATTEMPTS).mean() if len(df) else None,
+    }
+
+    return {"summary": summary, "categories": categories, "heatmap": heatmap, "daily": daily, "quizzes": quizzes}
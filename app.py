@@ -3,12 +3,10 @@ import pymongo
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
-from pymongo import MongoClient
-import os
-from dotenv import load_env
+import database
 
 # MongoDB Connection
-client = MongoClient(os.environ.get('MONGO_DB_URI'))
+client = database.get_client()
 db = client["quiz-db"]
 collection = db["scores"]
 
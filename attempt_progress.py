@@ -0,0 +1,131 @@
+"""Autosave for in-progress quiz attempts.
+
+Answer changes are buffered per attempt and a background thread writes them
+every `AUTOSAVE_INTERVAL` seconds as `$set` deltas on
+`<subject>.attempt_progress`, one bulk write per subject. Repeated clicks on
+the same question between flushes collapse into one field update, so write
+volume is bounded by the number of active attempts, not by clicks.
+"""
+import os
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+import database
+from grading import UNANSWERED
+
+PROGRESS_COLLECTION = "attempt_progress"
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+class AutosaveManager:
+    def __init__(self, client, interval=5.0):
+        self.interval = interval
+        self.writes = 0
+        self._client = client
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._indexed_subjects = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="attempt-autosave", daemon=True)
+        self._thread.start()
+
+    def _collection(self, subject):
+        collection = self._client[subject][PROGRESS_COLLECTION]
+        if subject not in self._indexed_subjects:
+            collection.create_index(
+                [("student_id", ASCENDING), ("quiz_id", ASCENDING)],
+                unique=True,
+                name="student_quiz"
+            )
+            self._indexed_subjects.add(subject)
+        return collection
+
+    def record(self, subject, student_id, quiz_id, idx, value):
+        """Buffer one answer change; only the latest value per question is written."""
+        with self._lock:
+            self._dirty.setdefault((subject, student_id, quiz_id), {})[str(idx)] = value
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+
+            by_subject = {}
+            for (subject, student_id, quiz_id), changes in dirty.items():
+                update = {f"answers.{idx}": value for idx, value in changes.items()}
+                update["updated_at"] = datetime.utcnow()
+                by_subject.setdefault(subject, []).append(UpdateOne(
+                    {"student_id": student_id, "quiz_id": quiz_id},
+                    {"$set": update},
+                    upsert=True
+                ))
+
+            for subject, ops in by_subject.items():
+                try:
+                    self._collection(subject).bulk_write(ops, ordered=False)
+                    self.writes += 1
+                except PyMongoError:
+                    self._requeue(subject, dirty)
+            return len(dirty)
+
+    def _requeue(self, subject, dirty):
+        # Newer clicks recorded since the failed flush take precedence
+        with self._lock:
+            for key, changes in dirty.items():
+                if key[0] == subject:
+                    merged = dict(changes)
+                    merged.update(self._dirty.get(key, {}))
+                    self._dirty[key] = merged
+
+    def load(self, subject, student_id, quiz_id, question_count):
+        """Return saved answer indices for an attempt (one read), or None."""
+        doc = self._collection(subject).find_one(
+            {"student_id": student_id, "quiz_id": quiz_id},
+            {"_id": 0, "answers": 1}
+        )
+        saved = dict(doc.get("answers", {})) if doc else {}
+        with self._lock:
+            # Changes still waiting for the next flush are newer than the stored ones
+            saved.update(self._dirty.get((subject, student_id, quiz_id), {}))
+        if not saved:
+            return None
+
+        answers = [UNANSWERED] * question_count
+        for idx, value in saved.items():
+            if int(idx) < question_count:
+                answers[int(idx)] = value
+        return answers
+
+    def clear(self, subject, student_id, quiz_id):
+        """Drop buffered and saved progress once an attempt is submitted."""
+        with self._flush_lock:
+            with self._lock:
+                self._dirty.pop((subject, student_id, quiz_id), None)
+            self._collection(subject).delete_one({"student_id": student_id, "quiz_id": quiz_id})
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+
+def get_autosave():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = AutosaveManager(
+                    database.get_client(),
+                    interval=float(os.getenv("AUTOSAVE_INTERVAL", "5.0")),
+                )
+    return _manager
@@ -0,0 +1,153 @@
+"""Analysis dashboard: pandas over raw history vs server-side aggregation.
+
+Inserts synthetic attempts for one student (and as many for other students)
+into a scratch database, then measures what the dashboard does on a rerun
+with a cold cache: the original page fetched every document and derived the
+chart data in pandas, the cached-frame path fetches the projected history
+once and runs `analysis_frames.summarize`, and the aggregation path runs
+`score_analytics.dashboard`. For each it reports the median time and the
+BSON bytes MongoDB sends back. Needs `MONGO_DB_URI` pointing at MongoDB 5.0+;
+the scratch database is dropped afterwards.
+
+    python benchmarks/bench_analysis_aggregation.py --sizes 1000 10000 100000
+
+`--mongomock` runs against an in-process mongomock instead (with `$dateTrunc`
+replaced by `$dateToString`, which mongomock supports). Its byte counts are
+the same as a server's, but its timings say nothing about a real server.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+import pandas as pd
+
+import analysis_frames
+import database
+import score_analytics
+
+STUDENT = "bench-student"
+QUIZZES = [f"bench{i}" for i in range(1, 41)]
+
+
+def make_attempts(student_id, count, rng):
+    start = datetime(2023, 1, 1)
+    return [{
+        "student_id": student_id,
+        "quiz_id": rng.choice(QUIZZES),
+        "score": rng.randint(0, 10),
+        "total": 10,
+        "timestamp": start + timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+        "answers": [rng.randint(0, 3) for _ in range(10)],
+    } for _ in range(count)]
+
+
+def bson_bytes(docs):
+    return sum(len(bson.encode(doc)) for doc in docs)
+
+
+def pandas_path(collection, student_id):
+    """What pages/analysis.py computed client-side before the aggregation layer."""
+    docs = list(collection.find({"student_id": student_id}))
+    df = pd.DataFrame(docs)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df = df.sort_values("timestamp")
+    df["accuracy"] = (df["score"] / df["total"]) * 100
+    df["performance_category"] = score_analytics.categorize(df["accuracy"])
+
+    df["accuracy"].mean(), df["quiz_id"].nunique(), df.tail(3)["accuracy"].mean()
+    df["performance_category"].value_counts()
+    df.pivot_table(index=df["timestamp"].dt.strftime('%Y-%m-%d'), columns="quiz_id",
+                   values="accuracy", aggfunc="mean").fillna(0)
+    df.set_index("timestamp").resample('D')['accuracy'].mean().dropna()
+    df.groupby("quiz_id")["accuracy"].last()
+    df.groupby("quiz_id")["accuracy"].mean()
+    below = df[df["accuracy"] < 75]
+    for quiz in below["quiz_id"].unique():
+        below[below["quiz_id"] == quiz]["accuracy"].mean()
+    return bson_bytes(docs)
+
+
+def frame_path(client, db_name, student_id):
+    """A cold analysis_frames load followed by the in-memory aggregates."""
+    rows = analysis_frames.AnalysisFrameCache()._fetch(client, db_name, student_id)
+    analysis_frames.summarize(analysis_frames._prepare(rows))
+    return bson_bytes(rows)
+
+
+class CountingCollection:
+    """Collection stand-in that records the BSON size of aggregation results."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.bytes = 0
+
+    def aggregate(self, pipeline, **kwargs):
+        docs = list(self.collection.aggregate(pipeline, **kwargs))
+        self.bytes = bson_bytes(docs)
+        return iter(docs)
+
+
+def aggregation_path(collection, student_id):
+    counting = CountingCollection(collection)
+    score_analytics.dashboard(counting, student_id, heatmap_quizzes=analysis_frames.HEATMAP_QUIZZES)
+    return counting.bytes
+
+
+def timed(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def run(client, size, repeats, rng):
+    db_name = f"bench_analysis_{os.getpid()}"
+    client.drop_database(db_name)
+    try:
+        collection = score_analytics.get_scores_collection(client, db_name)
+        docs = make_attempts(STUDENT, size, rng) + make_attempts("other-student", size, rng)
+        for start in range(0, len(docs), 10000):
+            collection.insert_many(docs[start:start + 10000], ordered=False)
+
+        results = [
+            ("pandas", timed(lambda: pandas_path(collection, STUDENT), repeats)),
+            ("frames", timed(lambda: frame_path(client, db_name, STUDENT), repeats)),
+            ("aggregation", timed(lambda: aggregation_path(collection, STUDENT), repeats)),
+        ]
+        print(f"{size:>8,} attempts  " + "  ".join(
+            f"{name} {ms:8.1f} ms {sent / 1024:9.1f} KB" for name, (ms, sent) in results
+        ))
+    finally:
+        client.drop_database(db_name)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--mongomock", action="store_true")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+
+        client = mongomock.MongoClient()
+        score_analytics.DAY = {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+    else:
+        client = database.get_client()
+    rng = random.Random(5)
+    for size in args.sizes:
+        run(client, size, args.repeats, rng)
+
+
+if __name__ == "__main__":
+    main()
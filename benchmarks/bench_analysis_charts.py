@@ -0,0 +1,128 @@
+"""Chart payload and render time on the analysis page, before and after lazy charts.
+
+For a synthetic student history this builds the page's figures the old way
+(every chart on every rerun, one point per attempt, one gauge per quiz) and
+the new way (only the open tab's charts, downsampled, specs cached by data
+version), and reports per rerun how long building and serializing the
+figures takes and how many bytes of Plotly JSON are sent to the browser.
+Serialization goes through the same calls `st.plotly_chart` makes.
+
+    python benchmarks/bench_analysis_charts.py --sizes 1000 10000 100000 --quizzes 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io
+import plotly.tools
+
+import analysis_charts
+import analysis_frames
+import score_analytics
+
+
+def make_history(size, quizzes, rng):
+    scores = rng.integers(0, 11, size)
+    df = pd.DataFrame({
+        "_id": np.arange(size),
+        "quiz_id": pd.Categorical([f"quiz{i}" for i in rng.integers(0, quizzes, size)]),
+        "score": scores,
+        "total": 10,
+        "accuracy": scores * 10.0,
+        "timestamp": pd.Timestamp("2022-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 3 * 365 * 86400, size)), "s"),
+    })
+    df["performance_category"] = score_analytics.categorize(df["accuracy"])
+    return df
+
+
+def send(figure_or_spec):
+    """What st.plotly_chart does with a figure: validate it and serialize the spec."""
+    figure = plotly.tools.return_figure_from_figure_or_data(figure_or_spec, validate_figure=True)
+    return len(plotly.io.to_json(figure, validate=False))
+
+
+def before(df):
+    """Every figure the page built per rerun before charts were made lazy."""
+    figures = []
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df["timestamp"], y=df["score"], mode='lines+markers', name='Score'))
+    fig.add_trace(go.Scatter(x=df["timestamp"], y=df["total"], mode='lines', name='Total Possible'))
+    fig.update_layout(xaxis=dict(rangeslider=dict(visible=True), type='date'))
+    figures.append(fig)
+
+    counts = df["performance_category"].value_counts().reset_index()
+    counts.columns = ["Category", "Count"]
+    figures.append(go.Figure(data=[go.Pie(labels=counts["Category"], values=counts["Count"], hole=.3)]))
+
+    pivot = df.pivot_table(index=df["timestamp"].dt.strftime('%Y-%m-%d'), columns="quiz_id",
+                           values="accuracy", aggfunc="mean").fillna(0)
+    figures.append(px.imshow(pivot, x=pivot.columns, y=pivot.index, aspect="auto", text_auto=True))
+
+    figures.append(px.bar(df, x="quiz_id", y="accuracy", color="accuracy", range_color=[0, 100],
+                          text=df["score"].astype(str) + "/" + df["total"].astype(str),
+                          hover_data=["timestamp", "score", "total"]))
+
+    daily = df.set_index("timestamp").resample('D')['accuracy'].mean().reset_index().dropna()
+    figures.append(px.line(daily, x="timestamp", y="accuracy", markers=True))
+
+    fig = go.Figure()
+    for _, row in df.groupby("quiz_id")["accuracy"].last().reset_index().iterrows():
+        fig.add_trace(go.Indicator(mode="gauge+number", value=row["accuracy"], domain={'x': [0, 1], 'y': [0, 1]}))
+    figures.append(fig)
+    return sum(send(fig) for fig in figures)
+
+
+def after(df, analysis, version, tab):
+    """Figures for one open tab, through the spec cache."""
+    key = ("bench", version)
+    quizzes = analysis["quizzes"]
+    average = analysis["summary"]["average"]
+    builders = {
+        "progress": [("progression", lambda: analysis_charts.progression_figure(df)),
+                     ("categories", lambda: analysis_charts.category_figure(analysis["categories"]))],
+        "heatmap": [("heatmap", lambda: analysis_charts.heatmap_figure(analysis["heatmap"]))],
+        "comparison": [("comparison", lambda: analysis_charts.comparison_figure(quizzes, average))],
+        "metrics": [("daily", lambda: analysis_charts.daily_figure(analysis["daily"])),
+                    ("gauges", lambda: analysis_charts.gauge_figure(quizzes, 1))],
+    }[tab]
+    return sum(send(analysis_charts.figure_spec(key + (name,), build)) for name, build in builders)
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def run(size, quizzes, rng):
+    df = make_history(size, quizzes, rng)
+    analysis = analysis_frames.summarize(df)
+
+    before_ms, before_bytes = timed(lambda: before(df))
+    print(f"{size:>8,} attempts  before: all charts    {before_ms:9.1f} ms  {before_bytes / 1024:9.1f} KB")
+    for tab in ["progress", "heatmap", "comparison", "metrics"]:
+        cold_ms, cold_bytes = timed(lambda: after(df, analysis, size, tab))
+        warm_ms, _ = timed(lambda: after(df, analysis, size, tab))
+        print(f"{'':>18}after: {tab:<14}{cold_ms:9.1f} ms  {cold_bytes / 1024:9.1f} KB  (cached rerun {warm_ms:6.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--quizzes", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(8)
+    for size in args.sizes:
+        run(size, args.quizzes, rng)
+
+
+if __name__ == "__main__":
+    main()
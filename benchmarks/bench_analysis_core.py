@@ -0,0 +1,118 @@
+"""In-memory analysis of a student's history: row-wise pandas vs the vectorized core.
+
+For synthetic histories this times what the analysis page computes on each
+rerun: a date + quiz filter, then the heatmap, daily means, per-quiz stats
+and study recommendations. The old path is the page's original code
+(`.dt.date` comparisons, a `strftime` pivot, `resample`, and one re-filter
+per quiz below the threshold); the new one is `analysis_frames.filter_frame`
+followed by `analysis_frames.summarize`. The outputs are compared before
+timing.
+
+    python benchmarks/bench_analysis_core.py --sizes 10000 100000 1000000 --quizzes 50 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import analysis_frames
+import score_analytics
+
+YEARS = 4
+
+
+def make_history(size, quizzes, rng):
+    scores = rng.integers(0, 11, size)
+    df = pd.DataFrame({
+        "_id": np.arange(size),
+        "quiz_id": pd.Categorical([f"quiz{i:04d}" for i in rng.zipf(1.3, size) % quizzes]),
+        "score": scores,
+        "total": 10,
+        "accuracy": scores * 10.0,
+        "timestamp": pd.Timestamp("2021-01-01") + pd.to_timedelta(
+            np.sort(rng.integers(0, YEARS * 365 * 86400, size)), "s"
+        ),
+    })
+    df["performance_category"] = score_analytics.categorize(df["accuracy"])
+    return df
+
+
+def old_path(df, start_date, end_date, selected):
+    df = df.assign(quiz_id=df["quiz_id"].astype(str))
+    filtered = df[(df["timestamp"].dt.date >= start_date) & (df["timestamp"].dt.date <= end_date)]
+    filtered = filtered[filtered["quiz_id"].isin(selected)]
+
+    heatmap = filtered.pivot_table(index=filtered["timestamp"].dt.strftime('%Y-%m-%d'), columns="quiz_id",
+                                   values="accuracy", aggfunc="mean")
+    daily = filtered.set_index("timestamp").resample('D')['accuracy'].mean().reset_index().dropna()
+    last = filtered.groupby("quiz_id")["accuracy"].last()
+    means = filtered.groupby("quiz_id")["accuracy"].mean()
+    below_threshold = filtered[filtered["accuracy"] < 75]
+    recommendations = {
+        quiz: below_threshold[below_threshold["quiz_id"] == quiz]["accuracy"].mean()
+        for quiz in below_threshold["quiz_id"].unique()
+    }
+    return heatmap, daily, last, means, recommendations
+
+
+def new_path(df, start_date, end_date, selected, heatmap_quizzes):
+    filtered = analysis_frames.filter_frame(df, start_date, end_date, selected)
+    return analysis_frames.summarize(filtered, heatmap_quizzes)
+
+
+def check(old, new):
+    heatmap, daily, last, means, recommendations = old
+    quizzes = new["quizzes"].set_index("quiz_id")
+    assert np.allclose(new["heatmap"].to_numpy(), heatmap.to_numpy(), equal_nan=True)
+    assert np.allclose(new["daily"]["accuracy"], daily["accuracy"])
+    assert np.allclose(quizzes["last_accuracy"], last) and np.allclose(quizzes["average"], means)
+    below = quizzes[quizzes["below_attempts"] > 0]["below_average"]
+    assert np.allclose(below, pd.Series(recommendations).reindex(below.index))
+
+
+def timed(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(size, quizzes, heatmap_quizzes, repeats, rng):
+    df = make_history(size, quizzes, rng)
+    days = df["timestamp"].dt.date
+    start_date, end_date = days.iloc[size // 10], days.iloc[-1]
+    selected = list(df["quiz_id"].cat.categories)
+
+    # Same columns on both sides for the comparison; the timed run caps them
+    check(old_path(df, start_date, end_date, selected), new_path(df, start_date, end_date, selected, quizzes))
+
+    old_ms = timed(lambda: old_path(df, start_date, end_date, selected), repeats)
+    new_ms = timed(lambda: new_path(df, start_date, end_date, selected, heatmap_quizzes), repeats)
+    print(f"{size:>9,} attempts  {quizzes:>4} quizzes  pandas {old_ms:9.1f} ms  "
+          f"vectorized {new_ms:8.1f} ms  ({old_ms / new_ms:5.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--quizzes", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--heatmap-quizzes", type=int, default=analysis_frames.HEATMAP_QUIZZES)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(21)
+    for size in args.sizes:
+        for quizzes in args.quizzes:
+            run(size, quizzes, args.heatmap_quizzes, args.repeats, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Near-duplicate lookups against a large course deck.
+
+Fills an LSH index with synthetic cards, then times checking a batch of new
+cards (half of them light rewrites of stored cards) against it, compared with
+a brute-force signature scan over the whole deck.
+
+    python benchmarks/bench_card_dedup.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import card_dedup
+
+_vocabulary_rng = random.Random(3)
+VOCABULARY = ["".join(_vocabulary_rng.choices("abcdefghijklmnopqrstuvwxyz", k=_vocabulary_rng.randint(3, 10)))
+              for _ in range(20000)]
+
+
+def make_card(rng):
+    words = rng.choices(VOCABULARY, k=18)
+    return {"note": " ".join(words[:12]) + ".", "question": "What is " + " ".join(words[12:]) + "?"}
+
+
+def rewrite(card, rng):
+    words = card["note"].rstrip(".").split()
+    words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+    return {"note": " ".join(words) + ".", "question": card["question"]}
+
+
+def run(size, queries, rng):
+    cards = [make_card(rng) for _ in range(size)]
+    started = time.perf_counter()
+    signatures = [card_dedup.signature(card_dedup.card_text(card)) for card in cards]
+    signature_seconds = time.perf_counter() - started
+
+    index = card_dedup.LSHIndex()
+    started = time.perf_counter()
+    for sig in signatures:
+        index.add(sig)
+    build_seconds = time.perf_counter() - started
+
+    probes = [rewrite(rng.choice(cards), rng) if i % 2 else make_card(rng) for i in range(queries)]
+    probe_signatures = [card_dedup.signature(card_dedup.card_text(card)) for card in probes]
+
+    started = time.perf_counter()
+    lsh_hits = sum(index.find(sig) is not None for sig in probe_signatures)
+    lsh_ms = (time.perf_counter() - started) * 1000 / queries
+
+    matrix = np.stack(signatures)
+    started = time.perf_counter()
+    scan_hits = sum(
+        bool(((matrix == sig).sum(axis=1) / card_dedup.NUM_PERM >= card_dedup.THRESHOLD).any())
+        for sig in probe_signatures
+    )
+    scan_ms = (time.perf_counter() - started) * 1000 / queries
+
+    print(f"{size:>8,} cards  signatures {signature_seconds:6.2f} s  index {build_seconds:6.2f} s  "
+          f"lookup {lsh_ms:6.3f} ms vs scan {scan_ms:7.3f} ms  "
+          f"duplicates found {lsh_hits}/{scan_hits} (LSH/scan) of {queries // 2} planted")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    for size in args.sizes:
+        run(size, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Throughput of the LLM gateway against the local stub server.
+
+Compares the original pattern (a new OpenAI client per request, SDK default
+retries) with the shared gateway under the same concurrency and error rate.
+
+    python benchmarks/bench_llm_gateway.py --requests 200 --concurrency 20 --rate-limit-rate 0.1
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+
+import llm_stub_server
+from flashcard_generation import MODEL, build_prompt
+
+API_KEY = "stub-key"
+MESSAGES = [{"role": "user", "content": build_prompt("Photosynthesis converts light into energy. " * 200, 5)}]
+
+
+def naive_call(base_url):
+    client = openai.OpenAI(api_key=API_KEY, base_url=base_url)
+    return client.chat.completions.create(model=MODEL, messages=MESSAGES, response_format={"type": "json_object"})
+
+
+def run(label, call, requests, concurrency):
+    latencies = []
+    failures = 0
+
+    def timed():
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency in pool.map(lambda _: timed(), range(requests)):
+            if latency is None:
+                failures += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else float("nan")
+    print(f"{label:<10} {requests / elapsed:>8.1f} req/s  p50 {statistics.median(latencies) if latencies else float('nan'):.3f}s"
+          f"  p95 {p95:.3f}s  failures {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    server, base_url = llm_stub_server.start_in_thread(
+        port=0, latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=0
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("OPENAI_TOKENS_PER_MINUTE", "100000000")
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.concurrency))
+
+    import llm_gateway
+    gateway = llm_gateway.LLMGateway()
+
+    try:
+        run("naive", lambda: naive_call(base_url), args.requests, args.concurrency)
+        run("gateway", lambda: gateway.chat_completion(
+            API_KEY, model=MODEL, messages=MESSAGES, response_format={"type": "json_object"}
+        ), args.requests, args.concurrency)
+        print("gateway stats:", gateway.stats())
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare the original page loop against pdf_extract on synthetic PDFs.
+
+    python benchmarks/bench_pdf_extract.py [10 100 1000]
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+
+import pdf_extract
+
+LINES_PER_PAGE = 40
+
+
+def make_pdf(page_count):
+    """Build a minimal text PDF with `page_count` pages of Helvetica text."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(page_count):
+        lines = [f"(Page {page + 1} line {line}: lorem ipsum dolor sit amet consectetur) Tj T*"
+                 for line in range(LINES_PER_PAGE)]
+        stream = ("BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(lines) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(page_refs) + b"] /Count %d >>" % page_count
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def legacy_extract(data):
+    """The Flashcard page's original loop."""
+    text = ""
+    for page in PdfReader(io.BytesIO(data)).pages:
+        text += page.extract_text() + "\n"
+    return text
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main(sizes):
+    print(f"{'pages':>6} {'legacy s':>10} {'stream s':>10} {'parallel s':>11} {'speedup':>8}")
+    for page_count in sizes:
+        data = make_pdf(page_count)
+        legacy_text, legacy_s = timed(legacy_extract, data)
+        stream_text, stream_s = timed(pdf_extract.extract_pdf_text, data, parallel_threshold=sys.maxsize)
+        parallel_text, parallel_s = timed(pdf_extract.extract_pdf_text, data, parallel_threshold=1)
+        assert legacy_text == stream_text == parallel_text
+        best = min(stream_s, parallel_s)
+        print(f"{page_count:>6} {legacy_s:>10.3f} {stream_s:>10.3f} {parallel_s:>11.3f} {legacy_s / best:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000])
@@ -0,0 +1,76 @@
+"""Build and query latency of the per-course vector index.
+
+Passages are synthetic sentences drawn from a fixed vocabulary. For each size
+the benchmark embeds and appends the passages in batches, reopens the index
+from disk (memory-mapped), and times top-k queries.
+
+    python benchmarks/bench_vector_index.py --sizes 10000 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_index
+
+VOCABULARY = [f"concept{i}" for i in range(20000)]
+BATCH = 10000
+
+
+def make_passages(count, rng, words=40):
+    return [" ".join(rng.choices(VOCABULARY, k=words)) + "." for _ in range(count)]
+
+
+def run(size, queries, k, rng):
+    path = tempfile.mkdtemp(prefix="bench-vector-index-")
+    embedder = vector_index.HashingEmbedder()
+    try:
+        index = vector_index.VectorIndex(path, embedder)
+        embed_seconds = 0.0
+        started = time.perf_counter()
+        for start in range(0, size, BATCH):
+            passages = make_passages(min(BATCH, size - start), rng)
+            embed_started = time.perf_counter()
+            vectors = embedder.embed(passages)
+            embed_seconds += time.perf_counter() - embed_started
+            index.add_chunks(passages, "bench", vectors=vectors)
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = vector_index.VectorIndex(path, embedder)
+        open_ms = (time.perf_counter() - started) * 1000
+
+        latencies = []
+        for query in make_passages(queries, rng, words=4):
+            started = time.perf_counter()
+            index.search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        print(f"{size:>9,} passages  build {build_seconds:7.1f} s ({size / build_seconds:8,.0f}/s, "
+              f"embedding {embed_seconds:.1f} s)  open {open_ms:5.1f} ms  "
+              f"query p50 {statistics.median(latencies):7.2f} ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:7.2f} ms")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=vector_index.TOP_K)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    for size in args.sizes:
+        run(size, args.queries, args.k, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Local stand-in for the OpenAI chat-completions endpoint.
+
+Answers POST /v1/chat/completions with a flashcard JSON reply (streamed as
+SSE when the request sets "stream": true) after a configurable delay, and
+fails a configurable share of requests with 429 or 500 so retry behaviour
+can be exercised offline.
+
+    python benchmarks/llm_stub_server.py --port 8765 --latency-ms 800 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run Home.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_flashcards(prompt):
+    match = re.search(r"create (\d+) flashcards", prompt)
+    count = int(match.group(1)) if match else 5
+    return {"flashcards": [
+        {
+            "note": f"Key concept {i + 1} from the stub document.",
+            "question": f"Which statement describes concept {i + 1}?",
+            "correct_answer": f"Concept {i + 1} is correct",
+            "incorrect_answers": [f"Distractor {i + 1}.{j}" for j in range(1, 4)],
+        }
+        for i in range(count)
+    ]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.config
+        time.sleep(max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000)
+
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            self._send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error"}},
+                            headers={"Retry-After": str(config.retry_after)})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            self._send_json(500, {"error": {"message": "Internal error (stub)", "type": "server_error"}})
+            return
+
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        content = json.dumps(fake_flashcards(prompt))
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "stub")
+
+        if request.get("stream"):
+            self._stream(completion_id, model, content)
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream(self, completion_id, model, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+        piece = self.config.stream_chunk_chars
+        for start in range(0, len(content), piece):
+            send_event(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": content[start:start + piece]}, "finish_reason": None}],
+            }))
+            time.sleep(self.config.stream_delay_ms / 1000)
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def make_server(port=8765, latency_ms=800.0, jitter_ms=200.0, error_rate=0.0, rate_limit_rate=0.0,
+                retry_after=1, stream_chunk_chars=40, stream_delay_ms=20.0):
+    config = argparse.Namespace(
+        latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate,
+        rate_limit_rate=rate_limit_rate, retry_after=retry_after,
+        stream_chunk_chars=stream_chunk_chars, stream_delay_ms=stream_delay_ms,
+    )
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a stub server on a background thread; returns (server, base_url)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                         args.rate_limit_rate, args.retry_after)
+    print(f"Stub chat-completions server on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,206 @@
+"""Near-duplicate detection for generated flashcards.
+
+Each card's note and question are reduced to a MinHash signature over
+character 4-grams. Signatures are banded into an LSH index, so checking a
+card only compares it with the few cards that share a band, instead of with
+the whole deck. Candidates are confirmed when their estimated Jaccard
+similarity reaches `CARD_DEDUP_THRESHOLD`.
+
+Every course keeps a deck of the cards generated for it under
+`CARD_DECK_DIR/<course>/` (`cards.jsonl` plus `signatures.u32`), so cards that
+repeat earlier generation runs are recognised too.
+"""
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from vector_index import course_slug
+
+DECK_DIR = os.getenv("CARD_DECK_DIR", ".card_decks")
+THRESHOLD = float(os.getenv("CARD_DEDUP_THRESHOLD", "0.5"))
+NUM_PERM = 128
+BANDS = 32  # 32 bands of 4 rows: pairs at Jaccard 0.5 become candidates ~87% of the time
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+# Coefficients span the whole prime field; the uint64 products wrap, which still
+# gives independent-looking permutations (small coefficients would keep them monotone)
+_A = _rng.randint(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def card_text(card):
+    return f"{card.get('note', '')} {card.get('question', '')}"
+
+
+def signature(text):
+    """MinHash signature (uint32[NUM_PERM]) of text's character shingles."""
+    text = re.sub(r"\W+", " ", text.lower()).strip()
+    if len(text) < SHINGLE_SIZE:
+        text = text.ljust(SHINGLE_SIZE)
+    shingles = {zlib.crc32(text[i:i + SHINGLE_SIZE].encode("utf-8"))
+                for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _MERSENNE_PRIME
+    return (permuted.min(axis=1) & 0xFFFFFFFF).astype(np.uint32)
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(signature_a == signature_b)) / NUM_PERM
+
+
+class LSHIndex:
+    def __init__(self, bands=BANDS):
+        self.rows = NUM_PERM // bands
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, sig):
+        return [sig[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(len(self._buckets))]
+
+    def add(self, sig):
+        """Index a signature; returns its position."""
+        position = len(self._signatures)
+        self._signatures.append(sig)
+        for buckets, key in zip(self._buckets, self._band_keys(sig)):
+            buckets.setdefault(key, []).append(position)
+        return position
+
+    def find(self, sig, threshold=THRESHOLD):
+        """Return the position of the most similar indexed signature at or above threshold, or None."""
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(sig)):
+            candidates.update(buckets.get(key, ()))
+
+        best, best_score = None, threshold
+        for position in candidates:
+            score = similarity(sig, self._signatures[position])
+            if score >= best_score:
+                best, best_score = position, score
+        return best
+
+
+class Deck:
+    """The cards generated so far for one course, with their LSH index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cards = []
+        self._index = LSHIndex()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        try:
+            with open(self._file("cards.jsonl"), encoding="utf-8") as f:
+                lines = f.readlines()
+            signatures = np.fromfile(self._file("signatures.u32"), dtype=np.uint32)
+        except FileNotFoundError:
+            return
+        cards = [json.loads(line) for line in lines if line.endswith("\n")]
+        signatures = signatures[:len(signatures) // NUM_PERM * NUM_PERM].reshape(-1, NUM_PERM)
+        # An interrupted write leaves a partial line or one file longer than the other
+        count = min(len(cards), len(signatures))
+        if count != len(lines) or count * NUM_PERM * 4 != os.path.getsize(self._file("signatures.u32")):
+            with open(self._file("cards.jsonl"), "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(card) + "\n" for card in cards[:count])
+            with open(self._file("signatures.u32"), "r+b") as f:
+                f.truncate(count * NUM_PERM * 4)
+        for card, sig in zip(cards[:count], signatures[:count]):
+            self._cards.append(card)
+            self._index.add(sig)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def find(self, sig, threshold=THRESHOLD):
+        """Return the deck card that sig near-duplicates, or None."""
+        with self._lock:
+            position = self._index.find(sig, threshold)
+            return self._cards[position] if position is not None else None
+
+    def add(self, cards, signatures):
+        if not cards:
+            return
+        with self._lock:
+            with open(self._file("cards.jsonl"), "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(card) + "\n" for card in cards)
+            with open(self._file("signatures.u32"), "ab") as f:
+                f.write(np.stack(signatures).astype(np.uint32).tobytes())
+            for card, sig in zip(cards, signatures):
+                self._cards.append(card)
+                self._index.add(sig)
+
+
+_decks = {}
+_decks_lock = threading.Lock()
+
+
+def get_deck(course):
+    path = os.path.join(DECK_DIR, course_slug(course))
+    with _decks_lock:
+        if path not in _decks:
+            _decks[path] = Deck(path)
+        return _decks[path]
+
+
+class CardFilter:
+    """Drops near-duplicate cards from one generation as they arrive.
+
+    Cards that repeat each other are dropped. Cards that repeat a card already
+    in the course deck are replaced by the deck's version, or dropped when
+    drop_existing is set. `commit()` adds the genuinely new cards to the deck.
+    """
+
+    def __init__(self, deck=None, drop_existing=False, threshold=THRESHOLD):
+        self.deck = deck
+        self.drop_existing = drop_existing
+        self.threshold = threshold
+        self.duplicates = 0
+        self.existing = 0
+        self._batch = LSHIndex()
+        self._new_cards = []
+        self._new_signatures = []
+
+    def accept(self, card):
+        """Return the card to show (possibly the deck's copy), or None to drop it."""
+        sig = signature(card_text(card))
+        if self._batch.find(sig, self.threshold) is not None:
+            self.duplicates += 1
+            return None
+        self._batch.add(sig)
+
+        existing = self.deck.find(sig, self.threshold) if self.deck is not None else None
+        if existing is not None:
+            self.existing += 1
+            return None if self.drop_existing else existing
+
+        self._new_cards.append(card)
+        self._new_signatures.append(sig)
+        return card
+
+    def commit(self):
+        if self.deck is not None:
+            self.deck.add(self._new_cards, self._new_signatures)
+        self._new_cards, self._new_signatures = [], []
+
+
+def filter_cards(cards, deck=None, drop_existing=False):
+    """Return (cards, CardFilter) with near-duplicates removed; new cards are added to the deck."""
+    card_filter = CardFilter(deck, drop_existing)
+    kept = [card for card in map(card_filter.accept, cards) if card is not None]
+    card_filter.commit()
+    return kept, card_filter
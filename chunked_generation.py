@@ -0,0 +1,126 @@
+"""Map-reduce flashcard generation over a whole document.
+
+The single-request path only sees what fits in one prompt's token budget.
+Here the document is split into token-sized sections, each section gets its
+own generation request, and the per-section cards are merged back down to
+`num_cards`. Requests run concurrently on asyncio, capped by a semaphore and
+paced by the LLM gateway's per-key token budget, so wall-clock time stays
+close to one section's latency.
+"""
+import asyncio
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import card_dedup
+import llm_gateway
+import prompt_packing
+from flashcard_generation import (
+    CHARS_PER_TOKEN, DOCUMENT_TOKEN_BUDGET, MODEL, build_document_prompt, estimate_tokens, parse_flashcards
+)
+
+CHUNK_TOKENS = int(os.getenv("FLASHCARD_CHUNK_TOKENS", "3000"))
+MAX_CONCURRENCY = int(os.getenv("FLASHCARD_MAX_CONCURRENCY", "8"))
+OVERSAMPLE = 1.5  # ask for extra cards so merging has something to choose from
+
+
+def split_into_chunks(text, chunk_tokens=CHUNK_TOKENS):
+    """Split text on paragraph boundaries into sections of at most chunk_tokens."""
+    limit = min(chunk_tokens, DOCUMENT_TOKEN_BUDGET) * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    size = 0
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # Paragraphs longer than a whole section are cut into section-sized pieces
+        pieces = [paragraph[i:i + limit] for i in range(0, len(paragraph), limit)]
+        for piece in pieces:
+            if size + len(piece) > limit and current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _request_section(api_key, section, num_cards):
+    """Return (cards, prompt_tokens) for one section."""
+    prompt, _ = build_document_prompt(section, num_cards)
+    # The gateway applies the per-key request/token budgets and retries
+    response = llm_gateway.get_gateway().chat_completion(
+        api_key,
+        model=MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"}
+    )
+    return parse_flashcards(response.choices[0].message.content), estimate_tokens(prompt)
+
+
+async def _generate_sections(api_key, sections, cards_per_section, max_concurrency):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="flashcard-section") as executor:
+        async def generate(section):
+            async with semaphore:
+                return await loop.run_in_executor(
+                    executor, _request_section, api_key, section, cards_per_section
+                )
+
+        return await asyncio.gather(*(generate(section) for section in sections), return_exceptions=True)
+
+
+def merge_and_rank(section_cards, num_cards):
+    """Pick num_cards cards, taking each section's best cards in turn.
+
+    The model lists a section's most important concepts first, so taking
+    cards round-robin by rank spreads the deck across the whole document.
+    With more sections than cards, each round visits evenly spaced sections
+    first so the deck does not come only from the start of the document.
+    Near-duplicate cards from overlapping sections are dropped.
+    """
+    merged = []
+    card_filter = card_dedup.CardFilter()
+    step = max(1.0, len(section_cards) / max(num_cards, 1))
+    spread = {int(i * step) for i in range(min(num_cards, len(section_cards)))}
+    order = sorted(spread) + [i for i in range(len(section_cards)) if i not in spread]
+    depth = max((len(cards) for cards in section_cards), default=0)
+    for rank in range(depth):
+        for cards in (section_cards[i] for i in order):
+            if rank >= len(cards):
+                continue
+            if card_filter.accept(cards[rank]) is None:
+                continue
+            merged.append(cards[rank])
+            if len(merged) == num_cards:
+                return merged
+    return merged
+
+
+def generate_chunked(text, num_cards, api_key, chunk_tokens=CHUNK_TOKENS, max_concurrency=MAX_CONCURRENCY):
+    """Return (flashcards, failed_section_count, prompt_tokens_sent) for the whole document.
+
+    Raises the first section error if every section failed.
+    """
+    # Headers and footers are only recognisable across the whole document
+    sections = split_into_chunks(prompt_packing.normalize(text), chunk_tokens)
+    if not sections:
+        return [], 0, 0
+
+    cards_per_section = min(num_cards, max(1, math.ceil(num_cards * OVERSAMPLE / len(sections))))
+    results = asyncio.run(_generate_sections(api_key, sections, cards_per_section, max_concurrency))
+
+    succeeded = [result for result in results if not isinstance(result, Exception)]
+    errors = [result for result in results if isinstance(result, Exception)]
+    if not succeeded:
+        raise errors[0]
+    section_cards = [cards for cards, _ in succeeded]
+    prompt_tokens = sum(tokens for _, tokens in succeeded)
+    return merge_and_rank(section_cards, num_cards), len(errors), prompt_tokens
@@ -0,0 +1,67 @@
+import os
+
+from cache import TTLCache
+
+# course_id -> course_name, shared by every session in this process
+_course_names = TTLCache(
+    maxsize=int(os.getenv("COURSE_CACHE_SIZE", "2048")),
+    ttl=int(os.getenv("COURSE_CACHE_TTL", "600")),
+)
+
+
+def get_course_names(courses_collection, course_ids):
+    """Resolve course IDs to names, hitting Mongo once for all cache misses."""
+    names = {}
+    missing = []
+    for course_id in course_ids:
+        name = _course_names.get(course_id)
+        if name is None:
+            missing.append(course_id)
+        else:
+            names[course_id] = name
+
+    if missing:
+        cursor = courses_collection.find(
+            {"course_id": {"$in": missing}},
+            {"_id": 0, "course_id": 1, "course_name": 1}
+        )
+        for course in cursor:
+            _course_names.set(course["course_id"], course["course_name"])
+            names[course["course_id"]] = course["course_name"]
+
+    # Keep the caller's ordering and drop IDs that no longer exist
+    return [(course_id, names[course_id]) for course_id in course_ids if course_id in names]
+
+
+def get_course_name(courses_collection, course_id):
+    """Return the name of a single course, or None if it does not exist."""
+    resolved = get_course_names(courses_collection, [course_id])
+    return resolved[0][1] if resolved else None
+
+
+def create_course(courses_collection, course_id, course_name):
+    """Create a course and drop any stale cached name for its ID."""
+    courses_collection.insert_one({"course_id": course_id, "course_name": course_name})
+    invalidate(course_id)
+
+
+def rename_course(courses_collection, course_id, course_name):
+    """Rename a course and invalidate its cached name."""
+    result = courses_collection.update_one(
+        {"course_id": course_id},
+        {"$set": {"course_name": course_name}}
+    )
+    invalidate(course_id)
+    return result.matched_count > 0
+
+
+def invalidate(course_id=None):
+    """Forget one cached course name, or all of them when no ID is given."""
+    if course_id is None:
+        _course_names.clear()
+    else:
+        _course_names.pop(course_id)
+
+
+def cache_stats():
+    return _course_names.stats()
@@ -0,0 +1,151 @@
+"""Process-wide MongoDB connection shared by every page and session.
+
+Streamlit re-executes page scripts on each rerun, so a `MongoClient` built at
+page level means a fresh pool, TLS handshake and topology discovery per
+session. Pages call `get_client()` instead, which hands out one client (and
+therefore one bounded pool) per process.
+
+Pool behaviour is configured through environment variables:
+
+    MONGO_DB_URI                         connection string (required)
+    MONGO_MAX_POOL_SIZE                  default 50
+    MONGO_MIN_POOL_SIZE                  default 0
+    MONGO_MAX_IDLE_TIME_MS               default 60000
+    MONGO_CONNECT_TIMEOUT_MS             default 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS    default 5000
+    MONGO_SOCKET_TIMEOUT_MS              default 20000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS          default 10000
+    MONGO_READ_PREFERENCE                default primaryPreferred
+"""
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+load_dotenv()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so pages can show pool usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.checkout_failures = 0
+
+    def _bump(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._bump("checked_out")
+
+    def connection_checked_in(self, event):
+        self._bump("checked_in")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "in_use": self.checked_out - self.checked_in,
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+def _client_options():
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+        "readPreference": os.getenv("MONGO_READ_PREFERENCE", "primaryPreferred"),
+        "event_listeners": [pool_metrics],
+    }
+
+
+def get_connection_string():
+    return os.getenv("MONGO_DB_URI")
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                connection_string = get_connection_string()
+                if not connection_string:
+                    raise RuntimeError("MONGO_DB_URI is not set.")
+                _client = MongoClient(connection_string, **_client_options())
+    return _client
+
+
+def pool_stats():
+    return pool_metrics.snapshot()
+
+
+def health_check():
+    """Ping the cluster and report latency; never raises."""
+    started = time.perf_counter()
+    try:
+        get_client().admin.command("ping")
+    except Exception as e:
+        return {"ok": False, "error": str(e), "latency_ms": (time.perf_counter() - started) * 1000}
+    return {"ok": True, "latency_ms": (time.perf_counter() - started) * 1000}
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+if __name__ == "__main__":
+    print(health_check())
+    print(pool_stats())
@@ -0,0 +1,125 @@
+"""Shared flashcard decks persisted in Mongo.
+
+A deck is identified by the SHA-256 of the uploaded file and the generation
+parameters, with a unique index on that pair, so every student who uploads
+the same document with the same settings gets the same deck and the document
+is parsed and sent to the model once. Sessions keep only the deck ID and
+their position in it; deck contents are served from a per-process
+read-through cache sized by `DECK_CACHE_SIZE`.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+DECK_DB = "master_db"
+DECK_COLLECTION = "flashcard_decks"
+
+# deck_id -> list of cards, shared by every session in this process
+_deck_cards = TTLCache(
+    maxsize=int(os.getenv("DECK_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("DECK_CACHE_TTL", "3600")),
+)
+_indexes_ready = False
+_stats_lock = threading.Lock()
+_stats = {"db_reads": 0, "saved": 0, "reused": 0}
+
+
+def get_deck_collection(client):
+    global _indexes_ready
+    collection = client[DECK_DB][DECK_COLLECTION]
+    if not _indexes_ready:
+        collection.create_index(
+            [("content_hash", ASCENDING), ("params_key", ASCENDING)],
+            unique=True,
+            name="content_params"
+        )
+        _indexes_ready = True
+    return collection
+
+
+def params_key(params):
+    """Stable digest of the generation parameters."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def find_deck(client, content_hash, params):
+    """Return the ID of the deck for this document and parameters, or None."""
+    doc = get_deck_collection(client).find_one(
+        {"content_hash": content_hash, "params_key": params_key(params)},
+        {"_id": 1}
+    )
+    if doc is None:
+        return None
+    _count("reused")
+    return str(doc["_id"])
+
+
+def save_deck(client, content_hash, params, cards, file_name, generation_seconds, replace=False):
+    """Store a generated deck and return its ID.
+
+    If another process stored the same deck first, its deck is kept (and its
+    ID returned) unless replace is set, as it is when a student regenerates.
+    """
+    collection = get_deck_collection(client)
+    key = {"content_hash": content_hash, "params_key": params_key(params)}
+    now = datetime.utcnow()
+    contents = {"cards": cards, "card_count": len(cards), "generation_seconds": generation_seconds, "updated_at": now}
+    update = {"$setOnInsert": {"params": params, "file_name": file_name, "created_at": now}}
+    if replace:
+        update["$set"] = contents
+    else:
+        update["$setOnInsert"].update(contents)
+    try:
+        doc = collection.find_one_and_update(
+            key,
+            update,
+            upsert=True,
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Two concurrent upserts of a new key: one wins, the other reads its deck
+        doc = collection.find_one(key, {"_id": 1})
+
+    deck_id = str(doc["_id"])
+    _deck_cards.pop(deck_id)
+    _count("saved")
+    return deck_id
+
+
+def get_cards(client, deck_id):
+    """Return a deck's cards, reading through the process-wide cache; None if it does not exist."""
+    cards = _deck_cards.get(deck_id)
+    if cards is not None:
+        return cards
+
+    try:
+        object_id = ObjectId(deck_id)
+    except (InvalidId, TypeError):
+        return None
+    _count("db_reads")
+    doc = get_deck_collection(client).find_one({"_id": object_id}, {"_id": 0, "cards": 1})
+    if doc is None:
+        return None
+    _deck_cards.set(deck_id, doc["cards"])
+    return doc["cards"]
+
+
+def stats():
+    with _stats_lock:
+        counts = dict(_stats)
+    return {**counts, "cache": _deck_cards.stats()}
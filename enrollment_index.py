@@ -0,0 +1,88 @@
+"""Student -> subject enrollment index.
+
+Every course keeps its own `<subject>.enroll_stud` collection. Answering
+"which subjects is this student in" from those means scanning every database
+on the cluster, so enrollments are also recorded in one indexed collection.
+
+Run this module directly to backfill the index from existing `enroll_stud`
+collections:
+
+    python enrollment_index.py
+"""
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+INDEX_DB = "master_db"
+INDEX_COLLECTION = "enrollments"
+SYSTEM_DATABASES = ("admin", "local", "config")
+
+_indexes_ready = False
+
+
+def get_enrollment_collection(client):
+    global _indexes_ready
+    collection = client[INDEX_DB][INDEX_COLLECTION]
+    if not _indexes_ready:
+        collection.create_index(
+            [("student_id", ASCENDING), ("subject", ASCENDING)],
+            unique=True,
+            name="student_subject"
+        )
+        _indexes_ready = True
+    return collection
+
+
+def record_enrollment(client, student_id, subject):
+    """Upsert a (student, subject) pair; repeated calls are no-ops."""
+    get_enrollment_collection(client).update_one(
+        {"student_id": student_id, "subject": subject},
+        {"$setOnInsert": {"enrolled_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def get_student_subjects(client, student_id):
+    """Return the subjects a student is enrolled in with a single indexed query."""
+    cursor = get_enrollment_collection(client).find(
+        {"student_id": student_id},
+        {"_id": 0, "subject": 1}
+    ).sort("subject", ASCENDING)
+    return [doc["subject"] for doc in cursor]
+
+
+def backfill(client, batch_size=1000):
+    """Rebuild the index from every per-course `enroll_stud` collection."""
+    collection = get_enrollment_collection(client)
+    written = 0
+
+    for db_name in client.list_database_names():
+        if db_name in SYSTEM_DATABASES:
+            continue
+        db = client[db_name]
+        if "enroll_stud" not in db.list_collection_names():
+            continue
+
+        ops = []
+        for doc in db["enroll_stud"].find({}, {"_id": 0, "student_id": 1}):
+            if not doc.get("student_id"):
+                continue
+            ops.append(UpdateOne(
+                {"student_id": doc["student_id"], "subject": db_name},
+                {"$setOnInsert": {"enrolled_at": datetime.utcnow()}},
+                upsert=True
+            ))
+            if len(ops) >= batch_size:
+                written += collection.bulk_write(ops, ordered=False).upserted_count
+                ops = []
+        if ops:
+            written += collection.bulk_write(ops, ordered=False).upserted_count
+
+    return written
+
+
+if __name__ == "__main__":
+    import database
+
+    client = database.get_client()
+    print(f"Backfilled {backfill(client)} new enrollments into {INDEX_DB}.{INDEX_COLLECTION}")
@@ -0,0 +1,145 @@
+"""Prompt construction and response parsing for flashcard generation.
+
+Shared by the Flashcard page and the chunked generator so both ask the model
+for the same JSON shape and normalise cards the same way.
+"""
+import json
+import os
+
+import prompt_packing
+
+# Bump PROMPT_VERSION whenever the prompt changes so cached generations are not reused
+MODEL = "gpt-4o-mini"
+PROMPT_VERSION = 3
+DOCUMENT_TOKEN_BUDGET = int(os.getenv("FLASHCARD_DOCUMENT_TOKENS", "4000"))
+CHARS_PER_TOKEN = 4  # rough average for English text, used only for pre-splitting
+
+
+def estimate_tokens(text):
+    return prompt_packing.count_tokens(text)
+
+
+def build_document_prompt(text, num_cards, token_budget=DOCUMENT_TOKEN_BUDGET):
+    """Pack the document into the token budget; returns (prompt, PackedText)."""
+    packed = prompt_packing.pack(text, token_budget)
+    return build_prompt(packed.text, num_cards), packed
+
+
+def build_prompt(text, num_cards):
+    return f"""
+    Based on the following document, create {num_cards} flashcards paired with questions.
+
+    For each flashcard:
+    1. Extract an important concept or information as "note"
+    2. Create a corresponding question that tests understanding
+    3. Provide the correct answer
+    4. Include 3 incorrect answer options
+
+    Format your response as JSON with the following structure:
+    {{
+        "flashcards": [
+            {{
+                "note": "Brief explanation of a key concept",
+                "question": "Question about this concept",
+                "correct_answer": "The correct answer",
+                "incorrect_answers": ["Wrong option 1", "Wrong option 2", "Wrong option 3"]
+            }},
+            ... more flashcards ...
+        ]
+    }}
+
+    Document text:
+    {text}
+    """
+
+
+def process_card(card):
+    """Fill in any missing fields of a card returned by the model."""
+    # Check for different possible field names for the note/concept
+    note_content = card.get("note", card.get("concept", "No concept provided"))
+
+    return {
+        "note": note_content,
+        "question": card.get("question", "No question provided"),
+        "correct_answer": card.get("correct_answer", "No answer provided"),
+        "incorrect_answers": card.get("incorrect_answers", ["Option A", "Option B", "Option C"])
+    }
+
+
+def parse_flashcards(content):
+    """Parse the model's JSON reply; raises ValueError (incl. JSONDecodeError) if malformed."""
+    parsed_json = json.loads(content)
+
+    # Ensure we have the flashcards key
+    if "flashcards" not in parsed_json:
+        raise ValueError("Response does not contain 'flashcards' key")
+
+    return [process_card(card) for card in parsed_json["flashcards"]]
+
+
+class FlashcardStreamParser:
+    """Incrementally pull complete cards out of a streamed JSON reply.
+
+    Feed text deltas as they arrive; each call returns the cards whose JSON
+    objects were completed by that delta. Only objects directly inside the
+    "flashcards" array are emitted.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._card_start = None
+        self._finished = False
+
+    def feed(self, delta):
+        cards = []
+        if self._finished:
+            return cards
+        self._buffer += delta
+
+        if not self._in_array:
+            key_at = self._buffer.find('"flashcards"')
+            bracket_at = self._buffer.find("[", key_at) if key_at != -1 else -1
+            if bracket_at == -1:
+                return cards
+            self._in_array = True
+            self._pos = bracket_at + 1
+
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._card_start = i
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._card_start is not None:
+                    try:
+                        cards.append(process_card(json.loads(buffer[self._card_start:i + 1])))
+                    except ValueError:
+                        pass
+                    self._card_start = None
+            elif char == "]" and self._depth == 0:
+                self._finished = True
+                break
+        self._pos = len(buffer)
+
+        # Drop text that belongs to cards already emitted
+        if self._card_start is None and self._pos > 4096:
+            self._buffer = ""
+            self._pos = 0
+        return cards
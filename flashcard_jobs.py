@@ -0,0 +1,259 @@
+"""Document-to-flashcards pipeline, run as a background job.
+
+`submit` queues text extraction and card generation on the shared job queue
+and returns the Job at once; the Flashcard page polls it by ID. Everything
+here runs on a worker thread, so it reports through the job (`job.progress`,
+`job.report`) rather than calling Streamlit. For streamed generation
+`job.partial` is the list being filled, so the student can start on the first
+cards while the job is still running.
+
+Finished decks are stored with `deck_store`, keyed by the uploaded file's
+hash and the generation parameters. A job for a deck that already exists
+returns it without parsing the file, and identical submissions made while a
+job is running share that job instead of generating the deck again.
+"""
+import io
+import json
+import threading
+import time
+
+import docx
+
+import card_dedup
+import chunked_generation
+import database
+import deck_store
+import generation_cache
+import job_queue
+import llm_gateway
+import pdf_extract
+import review_scheduler
+import streaming_generation
+import text_cache
+import vector_index
+from flashcard_generation import MODEL, PROMPT_VERSION, build_document_prompt, estimate_tokens, parse_flashcards
+
+
+def extract_text(data, file_name, progress=None):
+    """Return the text of an uploaded file; raises ValueError for unusable files."""
+    file_extension = file_name.split('.')[-1].lower()
+
+    if file_extension == 'txt':
+        return data.decode('utf-8')
+
+    if file_extension == 'pdf':
+        try:
+            return pdf_extract.extract_pdf_text(data, progress=progress)
+        except pdf_extract.TextLimitExceeded as e:
+            raise ValueError(f"Document is too large to process: {e}") from e
+
+    if file_extension in ['docx', 'doc']:
+        doc = docx.Document(io.BytesIO(data))
+        return "".join(para.text + "\n" for para in doc.paragraphs)
+
+    raise ValueError(f"Unsupported file format: {file_extension}")
+
+
+def extract_text_cached(job, data, file_name, digest):
+    """Extract text, reusing earlier extractions of the same file."""
+    started = time.perf_counter()
+    text, cache_tier = text_cache.get(digest)
+
+    if text is None:
+        job.progress = "Extracting text"
+
+        def report_progress(done, total):
+            job.progress = f"Extracting text: page {done}/{total}"
+
+        text = extract_text(data, file_name, progress=report_progress)
+        text_cache.put(digest, text)
+
+    seconds = time.perf_counter() - started
+    if cache_tier:
+        job.report(f"⚡ Text cache hit ({cache_tier}): extracted in {seconds * 1000:.0f} ms")
+    else:
+        job.report(f"📄 Parsed document in {seconds:.2f} s (cached for next time)")
+    return text
+
+
+def retrieve_topic_text(job, document_text, source, course, topic):
+    """Add the document to the course's vector index and return the top-k passages for topic."""
+    job.progress = f"Finding passages about '{topic}'"
+    index = vector_index.get_index(course)
+    started = time.perf_counter()
+    added = index.add_document(document_text, source)
+    context, passages = vector_index.retrieve_context(course, topic)
+    job.report(
+        f"🔎 Using {len(passages)} passages about '{topic}' from {len(index):,} indexed passages "
+        f"for {course} ({added} new; {(time.perf_counter() - started) * 1000:.0f} ms)"
+    )
+    return context
+
+
+def generate_single(job, text, num_cards, api_key):
+    prompt, packed = build_document_prompt(text, num_cards)
+    job.report(
+        f"📦 Sending {estimate_tokens(prompt):,} prompt tokens: {packed.tokens:,} of "
+        f"{packed.source_tokens:,} document tokens ({packed.blocks_used}/{packed.blocks_total} passages)"
+    )
+    job.progress = "Generating flashcards"
+    response = llm_gateway.get_gateway().chat_completion(
+        api_key,
+        model=MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"}
+    )
+
+    result = response.choices[0].message.content
+    try:
+        return parse_flashcards(result)
+    except json.JSONDecodeError:
+        job.report(result, "code")  # Display the raw response for debugging
+        raise ValueError("Failed to parse JSON response from the API")
+
+
+def generate_whole_document(job, text, num_cards, api_key):
+    job.progress = "Generating flashcards from every section"
+    flashcards, failed_sections, prompt_tokens = chunked_generation.generate_chunked(text, num_cards, api_key)
+    if failed_sections:
+        job.report(f"{failed_sections} document section(s) could not be processed and were skipped.", "warning")
+    job.report(f"📦 Sent {prompt_tokens:,} prompt tokens across all document sections")
+    return flashcards
+
+
+def report_duplicates(job, card_filter):
+    if card_filter.duplicates or card_filter.existing:
+        existing_action = "skipped" if card_filter.drop_existing else "reused from the deck"
+        job.report(
+            f"🧹 Removed {card_filter.duplicates} near-duplicate card(s); {card_filter.existing} card(s) "
+            f"already in the course deck were {existing_action} ({len(card_filter.deck):,} cards in deck)"
+        )
+
+
+def remove_duplicate_cards(job, flashcards, deck, skip_existing):
+    flashcards, card_filter = card_dedup.filter_cards(flashcards, deck, skip_existing)
+    report_duplicates(job, card_filter)
+    return flashcards
+
+
+def generate_streamed(job, text, num_cards, api_key, key, card_filter):
+    job.progress = "Generating flashcards"
+    generation = streaming_generation.StreamingGeneration(
+        api_key, text, num_cards,
+        on_complete=lambda cards, seconds: generation_cache.put(key, cards, seconds),
+        card_filter=card_filter
+    )
+    job.partial = generation.flashcards
+    generation.join()
+
+    if generation.error:
+        if not generation.flashcards:
+            raise ValueError(generation.error)
+        job.report(f"Error generating flashcards: {generation.error}", "error")
+    if generation.first_card_seconds is not None:
+        job.report(
+            f"⏱️ First card ready after {generation.first_card_seconds:.2f} s; "
+            f"all {len(generation.flashcards)} cards after {generation.total_seconds:.2f} s "
+            f"({generation.prompt_tokens:,} prompt tokens sent)"
+        )
+    report_duplicates(job, card_filter)
+    return generation.flashcards
+
+
+def deck_params(num_cards, course, topic, whole_document, skip_existing):
+    """Generation settings that identify a shared deck."""
+    return {
+        "num_cards": num_cards,
+        "model": MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "whole_document": whole_document,
+        "topic": topic.lower(),
+        "skip_existing": skip_existing,
+        # Topic retrieval and deck filtering depend on the course's other material
+        "course": course if topic or skip_existing else None,
+    }
+
+
+def generate_cards(job, text, file_name, num_cards, api_key, course, topic, regenerate, whole_document, stream,
+                   skip_existing):
+    """Return (flashcards, generation_seconds) for extracted text."""
+    started = time.perf_counter()
+    # Narrow the material to the passages about the requested topic
+    if topic:
+        text = retrieve_topic_text(job, text, file_name, course, topic)
+
+    deck = card_dedup.get_deck(course)
+    prompt_version = f"{PROMPT_VERSION}-chunked" if whole_document else PROMPT_VERSION
+    key = generation_cache.make_key(text, num_cards, MODEL, prompt_version)
+    if not regenerate:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            job.report("⚡ Reused flashcards generated earlier for this document.")
+            return remove_duplicate_cards(job, cached, deck, skip_existing), time.perf_counter() - started
+
+    if stream and not whole_document:
+        card_filter = card_dedup.CardFilter(deck, skip_existing)
+        flashcards = generate_streamed(job, text, num_cards, api_key, key, card_filter)
+        return flashcards, time.perf_counter() - started
+
+    generate = generate_whole_document if whole_document else generate_single
+    flashcards = generate(job, text, num_cards, api_key)
+    generation_cache.put(key, flashcards, time.perf_counter() - started)
+    return remove_duplicate_cards(job, flashcards, deck, skip_existing), time.perf_counter() - started
+
+
+def run_generation(job, data, file_name, api_key, num_cards=5, course="General", topic="",
+                   regenerate=False, whole_document=False, stream=False, skip_existing=False):
+    """Return {"deck_id", "card_count"} for the document's deck; regenerate replaces a stored deck."""
+    client = database.get_client()
+    digest = text_cache.content_hash(data)
+    params = deck_params(num_cards, course, topic, whole_document, skip_existing)
+
+    if not regenerate:
+        deck_id = deck_store.find_deck(client, digest, params)
+        if deck_id is not None:
+            job.report("⚡ Opened the shared deck already generated for this document.")
+            return {"deck_id": deck_id, "card_count": len(deck_store.get_cards(client, deck_id) or [])}
+
+    text = extract_text_cached(job, data, file_name, digest)
+    if not text.strip():
+        raise ValueError("No text could be extracted from the document")
+
+    flashcards, seconds = generate_cards(
+        job, text, file_name, num_cards, api_key, course, topic, regenerate, whole_document, stream, skip_existing
+    )
+    if not flashcards:
+        return {"deck_id": None, "card_count": 0}
+    deck_id = deck_store.save_deck(client, digest, params, flashcards, file_name, seconds, replace=regenerate)
+    if regenerate:
+        review_scheduler.reset_deck(client, deck_id)
+    return {"deck_id": deck_id, "card_count": len(flashcards)}
+
+
+# (file hash, params key) -> Job still generating that deck
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def submit(data, file_name, api_key, num_cards=5, course="General", topic="",
+           regenerate=False, whole_document=False, stream=False, skip_existing=False):
+    """Queue a generation job, or join an identical one already running.
+
+    Raises job_queue.QueueFull when the queue is at capacity.
+    """
+    params = deck_params(num_cards, course, topic, whole_document, skip_existing)
+    key = (text_cache.content_hash(data), deck_store.params_key(params))
+    with _inflight_lock:
+        running = _inflight.get(key)
+        if running is not None and not running.finished and not regenerate:
+            return running
+
+        job = job_queue.get_job_queue().submit(
+            "flashcards", run_generation, data, file_name, api_key, num_cards=num_cards, course=course,
+            topic=topic, regenerate=regenerate, whole_document=whole_document, stream=stream,
+            skip_existing=skip_existing
+        )
+        for other_key in [k for k, other in _inflight.items() if other.finished]:
+            del _inflight[other_key]
+        _inflight[key] = job
+    return job
@@ -0,0 +1,100 @@
+"""Cache of generated flashcard lists.
+
+Entries are keyed on (document text hash, num_cards, model, prompt version),
+so changing any of those produces a fresh generation. A process-wide LRU
+sits in front of gzip-compressed JSON files under `GENERATION_CACHE_DIR`;
+both tiers expire entries after `GENERATION_CACHE_TTL` seconds. Each entry
+remembers how long the original generation took, which is reported as
+latency saved on every hit.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from cache import TTLCache
+
+CACHE_DIR = os.getenv("GENERATION_CACHE_DIR", ".generation_cache")
+TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+
+_memory = TTLCache(maxsize=int(os.getenv("GENERATION_CACHE_MEMORY_ENTRIES", "256")), ttl=TTL_SECONDS)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+
+def make_key(text, num_cards, model, prompt_version):
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    raw = f"{text_hash}:{num_cards}:{model}:{prompt_version}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json.gz")
+
+
+def _record(hit, saved_seconds=0.0):
+    with _stats_lock:
+        _stats["hits" if hit else "misses"] += 1
+        _stats["saved_seconds"] += saved_seconds
+
+
+def get(key):
+    """Return the cached flashcard list for a key, or None."""
+    entry = _memory.get(key)
+    if entry is None:
+        entry = _read_disk(key)
+        if entry is not None:
+            _memory.set(key, entry)
+
+    if entry is None:
+        _record(hit=False)
+        return None
+    _record(hit=True, saved_seconds=entry["generation_seconds"])
+    return entry["flashcards"]
+
+
+def _read_disk(key):
+    path = _path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > TTL_SECONDS:
+            os.remove(path)
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+
+
+def put(key, flashcards, generation_seconds):
+    entry = {"flashcards": flashcards, "generation_seconds": generation_seconds}
+    _memory.set(key, entry)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(key)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+    _sweep_expired()
+
+
+def _sweep_expired():
+    now = time.time()
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            if name.endswith(".json.gz") and now - os.path.getmtime(path) > TTL_SECONDS:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def stats():
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+            "memory_entries": len(_memory),
+        }
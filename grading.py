@@ -0,0 +1,113 @@
+"""Quiz grading against precompiled answer keys.
+
+A quiz is compiled once into an integer array holding the index of the
+correct option for each question (-1 when a question has no correct option).
+Submissions are stored the same way, as the index of the chosen option per
+question, so grading one attempt or re-grading every attempt of a quiz is a
+single NumPy comparison.
+
+Re-grade a quiz after fixing its answer key with:
+
+    python grading.py <subject> <quiz_id>
+"""
+import os
+
+import numpy as np
+from pymongo import UpdateOne
+
+from cache import TTLCache
+
+UNANSWERED = -1
+
+# (subject, quiz_id, version) -> answer key; bump a quiz's "version" when its key
+# changes. Keys edited without a version bump are picked up once they expire.
+_answer_keys = TTLCache(maxsize=512, ttl=int(os.getenv("ANSWER_KEY_TTL", "300")))
+
+
+def compile_answer_key(quiz, subject):
+    """Return the quiz's answer key as an int array, compiling it at most once per version."""
+    cache_key = (subject, quiz["quiz_id"], quiz.get("version", 0))
+    answer_key = _answer_keys.get(cache_key)
+    if answer_key is None:
+        answer_key = np.array([
+            next((i for i, opt in enumerate(question["options"]) if opt.get("is_correct")), UNANSWERED)
+            for question in quiz["questions"]
+        ], dtype=np.int16)
+        answer_key.setflags(write=False)
+        _answer_keys.set(cache_key, answer_key)
+    return answer_key
+
+
+def invalidate_answer_key(subject, quiz_id):
+    """Drop every cached key version for a quiz."""
+    for key in [k for k in _answer_keys.keys() if k[:2] == (subject, quiz_id)]:
+        _answer_keys.pop(key)
+
+
+def grade(answer_key, selected):
+    """Score one submission; unanswered questions and keyless questions never match."""
+    selected = np.asarray(selected, dtype=np.int16)
+    return int(np.count_nonzero((selected == answer_key) & (answer_key != UNANSWERED)))
+
+
+def grade_many(answer_key, submissions):
+    """Score a 2-D array of submissions (one row per attempt) in one pass."""
+    submissions = np.asarray(submissions, dtype=np.int16).reshape(-1, len(answer_key))
+    return np.count_nonzero((submissions == answer_key) & (answer_key != UNANSWERED), axis=1)
+
+
+def _stack_submissions(rows, width):
+    matrix = np.full((len(rows), width), UNANSWERED, dtype=np.int16)
+    for i, row in enumerate(rows):
+        row = row[:width]
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def regrade_quiz(test_scores_collection, quiz, batch_size=1000):
+    """Re-score every stored attempt of a quiz against its current answer key.
+
+    Only attempts saved with their `answers` array can be re-graded. Returns
+    the number of attempts whose score changed.
+    """
+    subject = test_scores_collection.database.name
+    invalidate_answer_key(subject, quiz["quiz_id"])
+    answer_key = compile_answer_key(quiz, subject)
+
+    docs = list(test_scores_collection.find(
+        {"quiz_id": quiz["quiz_id"], "answers": {"$exists": True}},
+        {"_id": 1, "answers": 1, "score": 1}
+    ))
+    if not docs:
+        return 0
+
+    matrix = _stack_submissions([doc["answers"] for doc in docs], len(answer_key))
+    scores = grade_many(answer_key, matrix)
+    old_scores = np.array([doc.get("score", -1) for doc in docs])
+    changed = np.flatnonzero(scores != old_scores)
+
+    ops = [
+        UpdateOne(
+            {"_id": docs[i]["_id"]},
+            {"$set": {"score": int(scores[i]), "total": len(answer_key)}}
+        )
+        for i in changed
+    ]
+    for start in range(0, len(ops), batch_size):
+        test_scores_collection.bulk_write(ops[start:start + batch_size], ordered=False)
+    return len(ops)
+
+
+if __name__ == "__main__":
+    import sys
+
+    import database
+
+    if len(sys.argv) != 3:
+        sys.exit("usage: python grading.py <subject> <quiz_id>")
+    subject, quiz_id = sys.argv[1:]
+    db = database.get_client()[subject]
+    quiz = db["quiz"].find_one({"quiz_id": quiz_id}, {"_id": 0})
+    if not quiz:
+        sys.exit(f"Quiz {quiz_id} not found in {subject}")
+    print(f"Re-graded {regrade_quiz(db['test_scores'], quiz)} attempts of {quiz_id}")
@@ -0,0 +1,228 @@
+"""Bounded background job queue shared by every session.
+
+Work submitted here runs on a fixed pool of worker threads instead of the
+Streamlit script thread, so it keeps going when the student navigates away
+and a burst of submissions cannot tie up more than `GENERATION_WORKERS`
+threads. A job is identified by an ID the page keeps in session state (and
+the URL); finished jobs are written to `JOB_RESULT_DIR` so their results
+survive reruns, new sessions and restarts until `JOB_RESULT_TTL` expires.
+
+Admission control: when `GENERATION_QUEUE_SIZE` jobs are already waiting,
+`submit` raises `QueueFull` with an estimate of when to retry.
+"""
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+
+RESULT_DIR = os.getenv("JOB_RESULT_DIR", ".generation_jobs")
+RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "32"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    def __init__(self, depth, retry_after):
+        super().__init__(f"{depth} jobs are already waiting; try again in about {retry_after:.0f} s")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class Job:
+    """State of one submitted job; workers update it in place while it runs."""
+
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = "Waiting for a free worker"
+        self.result = None
+        self.partial = None  # results made available while running; not persisted
+        self.error = None
+        self.messages = []  # (level, text) pairs for the page to show when the job ends
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def report(self, text, level="caption"):
+        self.messages.append((level, text))
+
+    def to_dict(self):
+        return {
+            "id": self.id, "kind": self.kind, "status": self.status, "result": self.result,
+            "error": self.error, "messages": self.messages, "submitted_at": self.submitted_at,
+            "started_at": self.started_at, "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["id"], data["kind"])
+        job.status = data["status"]
+        job.progress = "Finished"
+        job.result = data["result"]
+        job.error = data["error"]
+        job.messages = [tuple(message) for message in data["messages"]]
+        job.submitted_at = data["submitted_at"]
+        job.started_at = data["started_at"]
+        job.finished_at = data["finished_at"]
+        return job
+
+
+class JobQueue:
+    def __init__(self, workers=WORKERS, queue_size=QUEUE_SIZE, result_dir=RESULT_DIR):
+        self.workers = workers
+        self.result_dir = result_dir
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._counts = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "running": 0, "persist_errors": 0}
+        self._waits = deque(maxlen=500)
+        self._latencies = deque(maxlen=500)
+        os.makedirs(result_dir, exist_ok=True)
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"generation-worker-{i}", daemon=True).start()
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Queue func(job, *args, **kwargs); its return value becomes job.result.
+
+        Raises QueueFull when the queue is at capacity.
+        """
+        job = Job(uuid.uuid4().hex, kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, func, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self._counts["rejected"] += 1
+            raise QueueFull(self._queue.qsize(), self._estimated_wait()) from None
+
+        with self._lock:
+            self._counts["submitted"] += 1
+        return job
+
+    def get(self, job_id):
+        """Return the Job for an ID, loading finished jobs from disk; None if unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return Job.from_dict(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def position(self, job):
+        """Number of queued jobs submitted before this one."""
+        with self._lock:
+            return sum(1 for other in self._jobs.values()
+                       if other.status == QUEUED and other.submitted_at < job.submitted_at)
+
+    def _path(self, job_id):
+        # Job IDs come from the URL, so only accept what uuid4().hex produces
+        if not job_id.isalnum():
+            job_id = "invalid"
+        return os.path.join(self.result_dir, f"{job_id}.json")
+
+    def _worker(self):
+        while True:
+            job, func, args, kwargs = self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            job.progress = "Starting"
+            with self._lock:
+                self._counts["running"] += 1
+                self._waits.append(job.started_at - job.submitted_at)
+            try:
+                job.result = func(job, *args, **kwargs)
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            job.finished_at = time.time()
+            job.progress = "Finished"
+            persisted = self._persist(job)
+
+            with self._lock:
+                self._counts["running"] -= 1
+                self._counts[job.status] += 1
+                self._latencies.append(job.finished_at - job.submitted_at)
+                # Finished jobs are served from disk from now on
+                if persisted:
+                    self._jobs.pop(job.id, None)
+            self._queue.task_done()
+
+    def _persist(self, job):
+        path = self._path(job.id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            # Still served from memory, but lost on restart
+            job.report(f"This result could not be saved and will not survive a restart: {e}", "warning")
+            with self._lock:
+                self._counts["persist_errors"] += 1
+            return False
+        self._sweep_expired()
+        return True
+
+    def _sweep_expired(self):
+        now = time.time()
+        for name in os.listdir(self.result_dir):
+            path = os.path.join(self.result_dir, name)
+            try:
+                if now - os.path.getmtime(path) > RESULT_TTL:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _estimated_wait(self):
+        with self._lock:
+            latency = statistics.median(self._latencies) if self._latencies else 30.0
+        return (self._queue.qsize() / self.workers + 1) * latency
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            latencies = sorted(self._latencies)
+            counts = dict(self._counts)
+
+        def percentile(values, share):
+            return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+        return {
+            **counts,
+            "queue_depth": self._queue.qsize(),
+            "workers": self.workers,
+            "wait_p50": percentile(waits, 0.5),
+            "wait_p95": percentile(waits, 0.95),
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95),
+        }
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
@@ -0,0 +1,197 @@
+"""Process-wide gateway for chat-completion requests.
+
+All flashcard generation goes through here instead of building an
+`openai.OpenAI` client per call:
+
+* one client per API key, sharing a keep-alive HTTP connection pool;
+* retries on 429/5xx/connection errors with jittered exponential backoff,
+  honouring `Retry-After` when the API sends it;
+* per-key requests-per-minute and tokens-per-minute budgets;
+* a process-wide cap on in-flight requests.
+
+Set `OPENAI_BASE_URL` to point the gateway at the stub server in
+`benchmarks/llm_stub_server.py` for offline load tests.
+"""
+import os
+import random
+import threading
+import time
+
+import openai
+
+from flashcard_generation import estimate_tokens
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "20"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+OUTPUT_TOKEN_ESTIMATE = 1500
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class RateBudget:
+    """Thread-safe token bucket refilled continuously at per_minute units."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self._available = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._available >= amount:
+                    self._available -= amount
+                    return
+                wait = (amount - self._available) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, delta):
+        """Charge (or refund) the difference between estimated and actual usage."""
+        with self._lock:
+            self._refill()
+            self._available = min(self.capacity, self._available - delta)
+
+
+class _KeyState:
+    def __init__(self, api_key):
+        self.requests = RateBudget(REQUESTS_PER_MINUTE)
+        self.tokens = RateBudget(TOKENS_PER_MINUTE)
+        # The SDK keeps a keep-alive connection pool per client; reusing the
+        # client is what lets requests share connections
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_retries=0,  # retries are handled by the gateway
+            timeout=REQUEST_TIMEOUT
+        )
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._keys = {}
+        self._keys_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "tokens": 0, "in_flight": 0}
+
+    def _key_state(self, api_key):
+        with self._keys_lock:
+            if api_key not in self._keys:
+                self._keys[api_key] = _KeyState(api_key)
+            return self._keys[api_key]
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+    def _call(self, api_key, estimated_tokens, **kwargs):
+        state = self._key_state(api_key)
+        state.requests.acquire()
+        state.tokens.acquire(estimated_tokens)
+
+        attempt = 0
+        while True:
+            with self._slots:
+                self._count("in_flight")
+                try:
+                    return state, state.client.chat.completions.create(**kwargs)
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        self._count("failures")
+                        raise
+                    error = e
+                except Exception:
+                    self._count("failures")
+                    raise
+                finally:
+                    self._count("in_flight", -1)
+            self._count("retries")
+            self._backoff(attempt, error)
+            attempt += 1
+
+    def chat_completion(self, api_key, messages, **kwargs):
+        """Create a chat completion with budgeting, concurrency limiting and retries."""
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + OUTPUT_TOKEN_ESTIMATE
+        self._count("requests")
+        state, response = self._call(api_key, estimated, messages=messages, **kwargs)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            state.tokens.adjust(usage.total_tokens - estimated)
+            self._count("tokens", usage.total_tokens)
+        return response
+
+    def stream_chat_completion(self, api_key, messages, **kwargs):
+        """Yield streamed chunks; the concurrency slot is held until the stream ends.
+
+        Only opening the stream is retried; a failure mid-stream is raised.
+        """
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + OUTPUT_TOKEN_ESTIMATE
+        self._count("requests")
+        state = self._key_state(api_key)
+        state.requests.acquire()
+        state.tokens.acquire(estimated)
+
+        attempt = 0
+        while True:
+            with self._slots:
+                self._count("in_flight")
+                try:
+                    try:
+                        stream = state.client.chat.completions.create(messages=messages, stream=True, **kwargs)
+                    except RETRYABLE_ERRORS as e:
+                        if attempt >= self.max_retries:
+                            self._count("failures")
+                            raise
+                        error = e
+                    else:
+                        yield from stream
+                        return
+                finally:
+                    self._count("in_flight", -1)
+            self._count("retries")
+            self._backoff(attempt, error)
+            attempt += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -1,16 +1,21 @@
 import streamlit as st
-import openai
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from PyPDF2 import PdfReader
-import docx
 import pandas as pd
 import random
 import time
-import json
+from datetime import datetime
+import database
+import deck_store
+import flashcard_jobs
+import generation_cache
+import job_queue
+import review_scheduler
+
+REVIEW_BATCH_SIZE = int(os.getenv("REVIEW_BATCH_SIZE", "20"))
 
 # Set page config
 st.set_page_config(page_title="FlashQuiz Generator", page_icon="📚", layout="wide")
@@ -46,109 +51,12 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Function to extract text from different document types
-def extract_text(uploaded_file):
-    text = ""
-    file_extension = uploaded_file.name.split('.')[-1].lower()
-    
-    if file_extension == 'txt':
-        text = uploaded_file.getvalue().decode('utf-8')
-    
-    elif file_extension == 'pdf':
-        pdf_reader = PdfReader(uploaded_file)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-    
-    elif file_extension in ['docx', 'doc']:
-        doc = docx.Document(uploaded_file)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    
-    else:
-        st.error(f"Unsupported file format: {file_extension}")
-        return None
-    
-    return text
-
-# Function to generate flashcards and quizzes
-def generate_flashcards_and_quizzes(text, num_cards=5):
-    # Initialize OpenAI API
-    client = openai.OpenAI(api_key=st.session_state.openai_api_key)
-    
-    # Create a prompt for GPT-4o Mini
-    prompt = f"""
-    Based on the following document, create {num_cards} flashcards paired with questions.
-    
-    For each flashcard:
-    1. Extract an important concept or information as "note"
-    2. Create a corresponding question that tests understanding
-    3. Provide the correct answer
-    4. Include 3 incorrect answer options
-    
-    Format your response as JSON with the following structure:
-    {{
-        "flashcards": [
-            {{
-                "note": "Brief explanation of a key concept",
-                "question": "Question about this concept",
-                "correct_answer": "The correct answer",
-                "incorrect_answers": ["Wrong option 1", "Wrong option 2", "Wrong option 3"]
-            }},
-            ... more flashcards ...
-        ]
-    }}
-    
-    Document text:
-    {text[:15000]}  # Limiting to 15000 chars to avoid token limits
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Using GPT-4o Mini
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        
-        result = response.choices[0].message.content
-        
-        # Parse JSON response and ensure it has the expected structure
-        try:
-            parsed_json = json.loads(result)
-            
-            # Ensure we have the flashcards key
-            if "flashcards" not in parsed_json:
-                raise ValueError("Response does not contain 'flashcards' key")
-            
-            # Process each flashcard to ensure it has the required fields
-            processed_flashcards = []
-            for card in parsed_json["flashcards"]:
-                # Check for different possible field names for the note/concept
-                note_content = card.get("note", card.get("concept", "No concept provided"))
-                
-                processed_card = {
-                    "note": note_content,
-                    "question": card.get("question", "No question provided"),
-                    "correct_answer": card.get("correct_answer", "No answer provided"),
-                    "incorrect_answers": card.get("incorrect_answers", ["Option A", "Option B", "Option C"])
-                }
-                processed_flashcards.append(processed_card)
-            
-            return processed_flashcards
-            
-        except json.JSONDecodeError:
-            st.error("Failed to parse JSON response from the API")
-            st.code(result)  # Display the raw response for debugging
-            return None
-            
-    except Exception as e:
-        st.error(f"Error generating flashcards: {str(e)}")
-        return None
-
 # Initialize session state
 if 'current_step' not in st.session_state:
     st.session_state.current_step = 0
-if 'flashcards' not in st.session_state:
-    st.session_state.flashcards = None
+if 'deck_id' not in st.session_state:
+    # Only the deck ID and the position in it live in the session
+    st.session_state.deck_id = st.query_params.get("deck")
 if 'score' not in st.session_state:
     st.session_state.score = 0
 if 'total_questions' not in st.session_state:
@@ -163,6 +71,109 @@ if 'current_selection' not in st.session_state:
     st.session_state.current_selection = ""
 if 'answered' not in st.session_state:
     st.session_state.answered = False
+if 'generation_job_id' not in st.session_state:
+    # The job ID is also kept in the URL so a reload can resume polling
+    st.session_state.generation_job_id = st.query_params.get("job")
+if 'loaded_job_id' not in st.session_state:
+    st.session_state.loaded_job_id = None
+if 'review_queue' not in st.session_state:
+    # Card indexes to study in order; None walks the whole deck
+    st.session_state.review_queue = None
+if 'pending_reviews' not in st.session_state:
+    st.session_state.pending_reviews = []
+
+# Function to look up the current generation job
+def current_job():
+    job_id = st.session_state.generation_job_id
+    return job_queue.get_job_queue().get(job_id) if job_id else None
+
+# Function to check whether cards are still being generated
+def generation_in_progress():
+    job = current_job()
+    return job is not None and not job.finished
+
+# Function to get the cards of the current deck, or those streamed so far
+def current_cards():
+    if st.session_state.deck_id:
+        return deck_store.get_cards(database.get_client(), st.session_state.deck_id)
+    job = current_job()
+    if job is not None and not job.finished:
+        return job.partial
+    return None
+
+# Poll the generation job without rerunning the rest of the page
+@st.fragment(run_every=1)
+def render_job_status():
+    job = current_job()
+    waiting_idx = st.session_state.get("waiting_for_card")
+    cards = (job.partial or []) if job is not None else []
+
+    # Rerun the whole page once it has something new to show
+    if (job is None or job.finished
+            or (cards and st.session_state.loaded_job_id != job.id)
+            or (waiting_idx is not None and waiting_idx < len(cards))):
+        st.session_state.waiting_for_card = None
+        st.rerun()
+
+    if job.status == job_queue.QUEUED:
+        ahead = job_queue.get_job_queue().position(job)
+        st.info(f"⏳ Waiting for a free generator ({ahead} job(s) ahead of yours)")
+    else:
+        st.info(f"⏳ {job.progress}: {len(cards)} card(s) ready ({time.time() - job.started_at:.1f} s)")
+
+# Function to start a fresh quiz once a job's cards start arriving
+def load_job_result(job):
+    st.session_state.loaded_job_id = job.id
+    st.session_state.current_step = 0
+    st.session_state.score = 0
+    st.session_state.total_questions = 0
+    st.session_state.user_answers = []
+    st.session_state.current_selection = ""
+    st.session_state.answered = False
+    st.session_state.file_processed = True
+
+# Function to pick the cards to study: due cards first, then unseen ones
+def build_review_queue(flashcards):
+    student_id = st.session_state.get("student_id")
+    if not student_id or not st.session_state.deck_id:
+        return None
+    queue, next_due = review_scheduler.review_queue(
+        database.get_client(), student_id, st.session_state.deck_id, len(flashcards), REVIEW_BATCH_SIZE
+    )
+    if not queue:
+        if next_due is not None:
+            st.toast(f"No cards are due until {next_due:%d %b %H:%M} UTC; studying the whole deck.")
+        return None
+    return queue
+
+# Function to record a review outcome for spaced repetition
+def record_review(card, is_correct):
+    student_id = st.session_state.get("student_id")
+    if not student_id:
+        return
+    if st.session_state.deck_id:
+        review_scheduler.get_review_log().record(student_id, st.session_state.deck_id, card, is_correct)
+    else:
+        # Streamed deck not saved yet; recorded once it has an ID
+        st.session_state.pending_reviews.append((card, is_correct, datetime.utcnow()))
+
+# Function to reset the quiz for another pass over the deck
+def reset_quiz_state():
+    st.session_state.current_step = 0
+    st.session_state.answered = False
+    st.session_state.score = 0
+    st.session_state.total_questions = 0
+    st.session_state.user_answers = []
+    st.session_state.review_queue = None
+
+    # Clear answer-related session state
+    keys_to_remove = []
+    for key in st.session_state:
+        if key.startswith('q_') or key.startswith('a_'):
+            keys_to_remove.append(key)
+
+    for key in keys_to_remove:
+        del st.session_state[key]
 
 # Function to move to the next step
 def next_step():
@@ -178,6 +189,7 @@ def handle_answer_selection(answer):
 def submit_answer(idx, selected_answer, correct_answer, question, note):
     st.session_state.total_questions += 1
     is_correct = selected_answer == correct_answer
+    record_review(idx, is_correct)
     
     if is_correct:
         st.session_state.score += 1
@@ -206,48 +218,118 @@ uploaded_file = st.file_uploader("Upload a document (PDF, DOCX, TXT)", type=['pd
 
 # Number of flashcards selector
 num_cards = st.slider("Number of flashcards to generate", min_value=3, max_value=20, value=5)
+topic = st.text_input("Focus topic (optional)",
+                      help="Generate from the passages most relevant to this topic across all material "
+                           "uploaded for the active course, instead of from the whole document.").strip()
+whole_document = st.checkbox("Cover the whole document (generate from every section in parallel)")
+regenerate = st.checkbox("Regenerate (ignore previously generated cards for this document)")
+skip_existing = st.checkbox("Skip cards already in this course's deck",
+                            help="Drop cards that closely repeat cards generated earlier for the active course.")
+stream_cards = st.checkbox("Show cards as they are generated", value=True,
+                           help="Start studying the first card while the rest are still being written. "
+                                "Not used when covering the whole document.")
 
 # Process button
-if uploaded_file and st.session_state.openai_api_key and st.button("Generate FlashQuiz"):
-    with st.spinner("Processing document and generating flashcards..."):
-        # Extract text from document
-        document_text = extract_text(uploaded_file)
-        
-        if document_text:
-            # Generate flashcards and quizzes
-            flashcards_data = generate_flashcards_and_quizzes(document_text, num_cards)
-            
-            if flashcards_data is not None:
-                st.session_state.flashcards = flashcards_data
-                st.session_state.current_step = 0
-                st.session_state.score = 0
-                st.session_state.total_questions = 0
-                st.session_state.user_answers = []
-                st.session_state.current_selection = ""
-                st.session_state.answered = False
-                st.session_state.file_processed = True
+if uploaded_file and st.session_state.openai_api_key and st.button(
+        "Generate FlashQuiz", disabled=generation_in_progress()):
+    try:
+        job = flashcard_jobs.submit(
+            uploaded_file.getvalue(), uploaded_file.name, st.session_state.openai_api_key,
+            num_cards=num_cards, course=st.session_state.get("active_course", "General"), topic=topic,
+            regenerate=regenerate, whole_document=whole_document, stream=stream_cards,
+            skip_existing=skip_existing
+        )
+    except job_queue.QueueFull as e:
+        st.warning(f"Too many FlashQuizzes are being generated right now: {e}.")
+    else:
+        st.session_state.generation_job_id = job.id
+        st.session_state.loaded_job_id = None
+        st.session_state.deck_id = None
+        st.session_state.file_processed = False
+        st.session_state.current_step = 0
+        st.query_params.pop("deck", None)
+        st.query_params["job"] = job.id
+        st.rerun()
+
+# Generation job status
+job = current_job()
+if job is not None:
+    deck_ready = job.status == job_queue.DONE and job.result["deck_id"] is not None
+    # Cards to study: streamed ones while running, the stored deck once finished
+    has_cards = deck_ready or (not job.finished and bool(job.partial))
+    if has_cards and st.session_state.loaded_job_id != job.id:
+        load_job_result(job)
+    elif job.finished and not deck_ready and st.session_state.loaded_job_id == job.id:
+        # Streamed cards that never became a deck are gone
+        st.session_state.loaded_job_id = None
+        st.session_state.file_processed = False
+        st.session_state.current_step = 0
+    if deck_ready and st.session_state.deck_id != job.result["deck_id"]:
+        st.session_state.deck_id = job.result["deck_id"]
+        st.query_params["deck"] = job.result["deck_id"]
+        if st.session_state.get("student_id"):
+            for card, is_correct, reviewed_at in st.session_state.pending_reviews:
+                review_scheduler.get_review_log().record(
+                    st.session_state.student_id, st.session_state.deck_id, card, is_correct, reviewed_at
+                )
+        st.session_state.pending_reviews = []
+
+    if not job.finished:
+        render_job_status()
+    if st.session_state.current_step == 0:
+        for level, text in job.messages:
+            getattr(st, level)(text)
+        if job.status == job_queue.FAILED:
+            st.error(f"Error generating flashcards: {job.error}")
+        elif job.status == job_queue.DONE and not deck_ready:
+            st.info("Every generated card is already in this course's deck. Untick 'Skip cards' to study them again.")
+        elif has_cards:
+            if job.finished:
                 st.success("FlashQuiz generated! Click 'Start Quiz' to begin.")
+            else:
+                st.success("FlashQuiz is being generated! Click 'Start Quiz' to begin with the first cards.")
+elif st.session_state.generation_job_id and not st.session_state.deck_id:
+    st.warning("That FlashQuiz has expired. Please generate it again.")
+    st.session_state.generation_job_id = None
+
+# Cards of the current deck (served from the shared deck cache)
+flashcards = current_cards()
+if st.session_state.deck_id and flashcards is None:
+    st.warning("That FlashQuiz deck no longer exists. Please generate it again.")
+    st.session_state.deck_id = None
+    st.session_state.file_processed = False
+    st.query_params.pop("deck", None)
+elif flashcards and not st.session_state.file_processed and st.session_state.loaded_job_id is None:
+    # Opened from a shared deck link
+    st.session_state.file_processed = True
 
 # Start quiz button
 if st.session_state.file_processed and st.session_state.current_step == 0:
-    if st.button("Start Quiz"):
+    if not flashcards and not generation_in_progress():
+        # e.g. every card was skipped as a duplicate of the course deck
+        st.info("This FlashQuiz has no cards to study. Untick 'Skip cards' or upload another document.")
+    elif flashcards and st.button("Start Quiz"):
+        st.session_state.review_queue = build_review_queue(flashcards)
         next_step()
         st.rerun()
 
 # Display flashcards and questions
-if st.session_state.flashcards and st.session_state.current_step > 0:
-    # Get current flashcard index
-    idx = (st.session_state.current_step - 1) // 2
+if (flashcards or generation_in_progress()) and st.session_state.current_step > 0:
+    # Get current flashcard index; review sessions follow the scheduler's queue
+    position = (st.session_state.current_step - 1) // 2
+    queue = st.session_state.review_queue
+    card_total = len(queue) if queue is not None else len(flashcards or [])
+    idx = queue[position] if queue is not None and position < len(queue) else position
     
     # Check if we're still within the flashcards range
-    if idx < len(st.session_state.flashcards):
-        current_card = st.session_state.flashcards[idx]
+    if position < card_total:
+        current_card = flashcards[idx]
         
         # Even steps show flashcard
         if st.session_state.current_step % 2 == 1:
             st.markdown(f"""
             <div class='flashcard'>
-                <h3>Flashcard {idx + 1}/{len(st.session_state.flashcards)}</h3>
+                <h3>Flashcard {position + 1}/{card_total}</h3>
                 <p>{current_card['note']}</p>
             </div>
             """, unsafe_allow_html=True)
@@ -260,7 +342,7 @@ if st.session_state.flashcards and st.session_state.current_step > 0:
         else:
             st.markdown(f"""
             <div class='question'>
-                <h3>Question {idx + 1}/{len(st.session_state.flashcards)}</h3>
+                <h3>Question {position + 1}/{card_total}</h3>
                 <p>{current_card['question']}</p>
             </div>
             """, unsafe_allow_html=True)
@@ -314,6 +396,11 @@ if st.session_state.flashcards and st.session_state.current_step > 0:
                     next_step()
                     st.rerun()
     
+    # Next card is still being generated
+    elif generation_in_progress():
+        st.session_state.waiting_for_card = position
+        st.info("⏳ The next flashcard is still being generated...")
+
     # End of quiz - show results
     else:
         score_percentage = int((st.session_state.score / st.session_state.total_questions) * 100) if st.session_state.total_questions > 0 else 0
@@ -339,25 +426,22 @@ if st.session_state.flashcards and st.session_state.current_step > 0:
             else:
                 st.success("Excellent! You answered all questions correctly.")
         
+        # Review the cards that are due again, keeping this deck
+        if st.session_state.get("student_id") and st.session_state.deck_id and st.button("Review Due Cards"):
+            reset_quiz_state()
+            st.session_state.review_queue = build_review_queue(flashcards)
+            next_step()
+            st.rerun()
+
         # Option to restart
         if st.button("Start Over"):
             # Reset all quiz-related state
-            st.session_state.current_step = 0
+            reset_quiz_state()
             st.session_state.file_processed = False
-            st.session_state.answered = False
-            st.session_state.score = 0
-            st.session_state.total_questions = 0
-            st.session_state.user_answers = []
-            
-            # Clear answer-related session state
-            keys_to_remove = []
-            for key in st.session_state:
-                if key.startswith('q_') or key.startswith('a_'):
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del st.session_state[key]
-                
+            st.session_state.generation_job_id = None
+            st.session_state.deck_id = None
+            st.query_params.pop("job", None)
+            st.query_params.pop("deck", None)
             st.rerun()
 
 # Display errors in a special debug section if in development
@@ -365,6 +449,31 @@ if st.session_state.get('debug_info'):
     with st.expander("Debug Information"):
         st.write(st.session_state.debug_info)
 
+# Generation cache statistics
+gen_stats = generation_cache.stats()
+if gen_stats["hits"] or gen_stats["misses"]:
+    st.caption(
+        f"Generation cache: {gen_stats['hits']} hits / {gen_stats['misses']} misses "
+        f"({gen_stats['hit_rate']:.0%} hit rate, {gen_stats['saved_seconds']:.1f} s of model time saved)"
+    )
+
+# Generation queue metrics
+queue_stats = job_queue.get_job_queue().stats()
+if queue_stats["submitted"] or queue_stats["rejected"]:
+    st.caption(
+        f"Generation queue: {queue_stats['queue_depth']} waiting, {queue_stats['running']}/{queue_stats['workers']} "
+        f"running, {queue_stats['rejected']} turned away; wait p50 {queue_stats['wait_p50']:.1f} s, "
+        f"job latency p50 {queue_stats['latency_p50']:.1f} s / p95 {queue_stats['latency_p95']:.1f} s"
+    )
+
+# Shared deck cache statistics
+deck_stats = deck_store.stats()
+if deck_stats["cache"]["hits"] or deck_stats["cache"]["misses"]:
+    st.caption(
+        f"Shared decks: {deck_stats['reused']} reused, {deck_stats['saved']} saved; deck cache "
+        f"{deck_stats['cache']['hit_rate']:.0%} hit rate ({deck_stats['db_reads']} database reads)"
+    )
+
 # Instructions and help
 with st.expander("How to use FlashQuiz Generator"):
     st.markdown("""
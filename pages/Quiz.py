@@ -1,24 +1,31 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from pymongo import MongoClient
-import time
 import os
 from dotenv import load_dotenv
+import attempt_progress
+import database
+import enrollment_index
+import grading
+import score_writer
 
 # Load environment variables
 load_dotenv()
 
+# Questions shown per page while attempting a quiz
+QUESTIONS_PER_PAGE = int(os.getenv("QUIZ_QUESTIONS_PER_PAGE", "10"))
+
+# Partial reruns need Streamlit's fragment API; older releases rerun the whole page
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda func: func)
+
 # MongoDB connection from .env
 CONNECTION_STRING = os.getenv("MONGO_DB_URI")
 if not CONNECTION_STRING:
     st.error("MongoDB connection string not found. Please set it in the .env file.")
     st.stop()
 
-@st.cache_resource
 def get_database():
-    client = MongoClient(CONNECTION_STRING)
-    return client
+    return database.get_client()
 
 student_id = st.session_state.get("student_id")
 
@@ -28,35 +35,55 @@ if not student_id:
 
 def get_quiz_subjects():
     client = get_database()
-    database_names = client.list_database_names()
-    quiz_subjects = []
-    
-    for db_name in database_names:
-        if db_name not in ['admin', 'local', 'config']:
-            db = client[db_name]
-            if "quiz" in db.list_collection_names() and "enroll_stud" in db.list_collection_names():
-                enrolled = db["enroll_stud"].find_one({"student_id": student_id})
-                if enrolled:
-                    quiz_subjects.append(db_name)
-    return quiz_subjects
+    return enrollment_index.get_student_subjects(client, student_id)
+
+@st.cache_resource
+def ensure_score_indexes(subject):
+    """Index test_scores once per subject so the attempt lookup stays cheap."""
+    get_database()[subject]["test_scores"].create_index([("student_id", 1), ("quiz_id", 1)])
+    return True
 
 def load_quizzes(subject):
+    """List quiz metadata plus the student's attempt status in one aggregation.
+
+    Question bodies are left on the server; `load_quiz` fetches them when the
+    student actually starts a quiz.
+    """
     client = get_database()
     db = client[subject]
-    quiz_collection = db["quiz"]
-    score_collection = db["test_scores"]
-
-    quizzes = list(quiz_collection.find({}, {"_id": 0, "quiz_id": 1, "title": 1, "desc": 1, "questions": 1}))
-
-    for quiz in quizzes:
-        quiz_id = quiz["quiz_id"]
-        score_doc = score_collection.find_one({"student_id": student_id, "quiz_id": quiz_id})
-        quiz["attempted"] = bool(score_doc)
-        if score_doc:
-            quiz["score"] = score_doc["score"]
-            quiz["total"] = score_doc["total"]
+    ensure_score_indexes(subject)
+
+    pipeline = [
+        {"$project": {
+            "_id": 0, "quiz_id": 1, "title": 1, "desc": 1,
+            "question_count": {"$size": {"$ifNull": ["$questions", []]}}
+        }},
+        {"$lookup": {
+            "from": "test_scores",
+            "let": {"quiz_id": "$quiz_id"},
+            "pipeline": [
+                {"$match": {"student_id": student_id, "$expr": {"$eq": ["$quiz_id", "$$quiz_id"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "score": 1, "total": 1}}
+            ],
+            "as": "attempt"
+        }},
+        {"$addFields": {
+            "attempted": {"$gt": [{"$size": "$attempt"}, 0]},
+            "score": {"$arrayElemAt": ["$attempt.score", 0]},
+            "total": {"$arrayElemAt": ["$attempt.total", 0]}
+        }},
+        {"$project": {"attempt": 0}}
+    ]
+
+    quizzes = list(db["quiz"].aggregate(pipeline))
     return pd.DataFrame(quizzes) if quizzes else pd.DataFrame()
 
+def load_quiz(subject, quiz_id):
+    """Fetch a single quiz including its questions."""
+    client = get_database()
+    return client[subject]["quiz"].find_one({"quiz_id": quiz_id}, {"_id": 0})
+
 def main():
     st.title("Quiz Attempt Page")
     st.subheader("Select a Subject")
@@ -80,7 +107,7 @@ def main():
                         st.markdown(f"### {quiz['title']}")
                         st.write(quiz.get('desc', 'No description available'))
 
-                        if quiz.get("attempted") and "score" in quiz:
+                        if quiz.get("attempted") and pd.notna(quiz.get("score")):
                             st.info(f"📊 You scored **{quiz['score']} / {quiz['total']}**")
 
                     with col2:
@@ -96,17 +123,75 @@ def main():
         st.warning("You are not enrolled in any quiz subjects.")
 
 def start_quiz(quiz, subject):
+    quiz = load_quiz(subject, quiz["quiz_id"])
+    if not quiz:
+        st.error("This quiz is no longer available.")
+        return
+
     st.session_state["quiz_started"] = True
     st.session_state["current_quiz"] = quiz
     st.session_state["selected_subject"] = subject
     st.session_state["quiz_id"] = quiz["quiz_id"]
     st.session_state["start_time"] = datetime.now()
 
-    if "answers" not in st.session_state:
-        st.session_state["answers"] = {f"q{idx + 1}": None for idx in range(len(quiz['questions']))}
-    
+    init_answer_state(quiz, subject)
     st.rerun()
 
+def init_answer_state(quiz, subject):
+    """Keep one chosen-option index per question (-1 while unanswered).
+
+    A fresh session resumes from the attempt's autosaved progress, if any.
+    """
+    if "answer_indices" not in st.session_state:
+        question_count = len(quiz['questions'])
+        saved = attempt_progress.get_autosave().load(subject, student_id, quiz["quiz_id"], question_count)
+        st.session_state["answer_indices"] = saved or [grading.UNANSWERED] * question_count
+        st.session_state["quiz_page"] = 0
+
+def record_answer(idx, options):
+    choice = st.session_state[f"q{idx + 1}"]
+    answer = options.index(choice) if choice in options else grading.UNANSWERED
+    st.session_state["answer_indices"][idx] = answer
+    attempt_progress.get_autosave().record(
+        st.session_state["selected_subject"], student_id, st.session_state["quiz_id"], idx, answer
+    )
+
+def change_page(delta):
+    st.session_state["quiz_page"] += delta
+
+@fragment
+def render_question_page(quiz):
+    """Render only the active page; answering or paging reruns just this fragment."""
+    questions = quiz['questions']
+    answers = st.session_state["answer_indices"]
+    page_count = max(1, -(-len(questions) // QUESTIONS_PER_PAGE))
+    page = min(st.session_state["quiz_page"], page_count - 1)
+    start = page * QUESTIONS_PER_PAGE
+
+    for idx in range(start, min(start + QUESTIONS_PER_PAGE, len(questions))):
+        question = questions[idx]
+        st.markdown(f"**Q{idx + 1}: {question['question']}**")
+
+        options = [option["option_text"] for option in question["options"]]
+        st.radio(
+            label=f"Select your answer for Q{idx + 1}:",
+            options=options,
+            key=f"q{idx + 1}",
+            index=answers[idx] if answers[idx] != grading.UNANSWERED else None,
+            on_change=record_answer,
+            args=(idx, options)
+        )
+
+    answered = sum(1 for answer in answers if answer != grading.UNANSWERED)
+    st.progress(answered / len(questions) if questions else 0.0,
+                text=f"Answered {answered}/{len(questions)} · Page {page + 1}/{page_count}")
+
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        st.button("⬅️ Previous", disabled=page == 0, on_click=change_page, args=(-1,))
+    with next_col:
+        st.button("Next ➡️", disabled=page >= page_count - 1, on_click=change_page, args=(1,))
+
 def attempt_quiz():
     quiz = st.session_state["current_quiz"]
     subject = st.session_state["selected_subject"]
@@ -115,51 +200,25 @@ def attempt_quiz():
     st.title(f"Attempt Quiz: {quiz['title']}")
     st.write(quiz['desc'])
 
-    if "answers" not in st.session_state:
-        st.session_state["answers"] = {f"q{idx + 1}": None for idx in range(len(quiz['questions']))}
-    
-    for idx, question in enumerate(quiz['questions']):
-        key = f"q{idx + 1}"
-        st.markdown(f"**Q{idx + 1}: {question['question']}**")
-        
-        options = [option["option_text"] for option in question["options"]]
-        prev_selection = st.session_state["answers"].get(key, None)
-        
-        selected_option = st.radio(
-            label=f"Select your answer for Q{idx + 1}:",
-            options=options,
-            key=key,
-            index=options.index(prev_selection) if prev_selection in options else 0
-        )
-        
-        st.session_state["answers"][key] = selected_option
-    
-    if st.button("Submit Quiz"):
-        score = 0
-        total = len(quiz['questions'])
-
-        for idx, question in enumerate(quiz['questions']):
-            key = f"q{idx + 1}"
-            selected_option = st.session_state["answers"].get(key, None)
-
-            correct_option = next((opt["option_text"] for opt in question["options"] if opt["is_correct"]), None)
+    init_answer_state(quiz, subject)
+    render_question_page(quiz)
 
-            if selected_option == correct_option:
-                score += 1
+    if st.button("Submit Quiz"):
+        answer_key = grading.compile_answer_key(quiz, subject)
+        selected = st.session_state["answer_indices"]
+        score = grading.grade(answer_key, selected)
+        total = len(answer_key)
 
         st.success(f"🎉 You scored {score}/{total}! 🎯")
-        save_test_score(subject, quiz_id, student_id, score, total)
+        save_test_score(subject, quiz_id, student_id, score, total, list(selected))
+        attempt_progress.get_autosave().clear(subject, student_id, quiz_id)
 
-        time.sleep(3)
         st.session_state["quiz_completed"] = True
         st.switch_page("pages/analysis.py")
         reset_session()
 
-def save_test_score(subject, quiz_id, student_id, score, total):
-    client = get_database()
-    db = client[subject]
-    test_scores_collection = db["test_scores"]
-
+def save_test_score(subject, quiz_id, student_id, score, total, answers=None):
+    """Queue the result for write-behind persistence; returns once it is journaled."""
     result_data = {
         "student_id": student_id,
         "quiz_id": quiz_id,
@@ -167,8 +226,11 @@ def save_test_score(subject, quiz_id, student_id, score, total):
         "total": total,
         "timestamp": datetime.utcnow()
     }
+    if answers is not None:
+        # Chosen option index per question, kept so the quiz can be re-graded
+        result_data["answers"] = answers
 
-    test_scores_collection.insert_one(result_data)
+    score_writer.get_score_writer().submit(subject, result_data)
     st.success("✅ Quiz result has been saved successfully!")
 
 def reset_session():
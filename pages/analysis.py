@@ -1,13 +1,12 @@
 import streamlit as st
-import pymongo
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from pymongo import MongoClient
-import os
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-import numpy as np
+from datetime import datetime
+import analysis_charts
+import analysis_frames
+import database
+import score_analytics
+import score_rollups
+import score_writer
 
 # Set Streamlit Page Config with improved styling
 st.set_page_config(
@@ -52,8 +51,10 @@ st.markdown("""
 # Load environment variables
 load_dotenv()
 
+TABLE_ROWS = 1000  # attempts shown in the data table for histories aggregated in MongoDB
+
 # MongoDB Connection
-client = MongoClient(os.environ.get('MONGO_DB_URI'))
+client = database.get_client()
 
 # Retrieve student ID and quiz ID from session
 student_id = st.session_state.get("student_id")
@@ -69,34 +70,37 @@ subject_name = "".join(filter(str.isalpha, quiz_id)).lower()
 # Connect to the Correct Database
 db = client[subject_name]
 
+# Make sure a just-submitted score is written before reading history
+writer = score_writer.get_score_writer()
+if writer.has_pending(subject_name, student_id):
+    writer.flush()
+
 # Ensure "test_scores" collection exists
 if "test_scores" not in db.list_collection_names():
     st.error(f"❌ Collection 'test_scores' not found in database '{subject_name}'.")
     st.stop()
 
-collection = db["test_scores"]
+# Running totals kept up to date on every score write
+rollup = score_rollups.get_rollup(client, subject_name, student_id, writer)
 
-# Fetch Student's Test Data
-student_data = list(collection.find({"student_id": student_id}))
-
-if not student_data:
+if rollup is None:
     st.warning(f"⚠️ No test data found for Student ID: {student_id}")
     st.stop()
 
-# Convert to DataFrame
-df = pd.DataFrame(student_data)
-df.columns = df.columns.str.strip().str.lower()  # Ensure consistency
-
-df["timestamp"] = pd.to_datetime(df["timestamp"])
-df = df.sort_values("timestamp")
+overview = score_rollups.overview(rollup)
 
-# Calculate additional metrics
-df["accuracy"] = (df["score"] / df["total"]) * 100
-df["performance_category"] = pd.cut(
-    df["accuracy"],
-    bins=[0, 60, 75, 90, 100],
-    labels=["Needs Improvement", "Satisfactory", "Good", "Excellent"]
-)
+# Full history from the process-wide cache; only attempts newer than the cached ones are fetched.
+# A history that is not cached yet loads in the background, and until it has (or if it is too
+# long to hold in memory) the charts are aggregated in MongoDB on each rerun instead.
+scores = score_analytics.get_scores_collection(client, subject_name)
+history = None
+if rollup["attempts"] <= analysis_frames.MAX_ROWS:
+    history, history_version = analysis_frames.get_frame_cache().get(
+        client, subject_name, student_id, expected_rows=rollup["attempts"], wait=False
+    )
+if history is None:
+    # The rollup changes with every written score, so it versions the aggregates
+    history_version = ("rollup", rollup["attempts"], rollup["updated_at"])
 
 # Create sidebar for interactive filtering
 with st.sidebar:
@@ -108,8 +112,8 @@ with st.sidebar:
     
     # Date range filter
     st.subheader("Filter Data")
-    min_date = df["timestamp"].min().date()
-    max_date = df["timestamp"].max().date()
+    min_date = overview["first_attempt"].date()
+    max_date = overview["last_attempt"].date()
     
     date_range = st.date_input(
         "Select Date Range",
@@ -120,27 +124,39 @@ with st.sidebar:
     
     if len(date_range) == 2:
         start_date, end_date = date_range
-        filtered_df = df[(df["timestamp"].dt.date >= start_date) & 
-                         (df["timestamp"].dt.date <= end_date)]
     else:
-        filtered_df = df
+        start_date = end_date = None
     
     # Quiz filter
     selected_quizzes = st.multiselect(
         "Select Quizzes",
-        options=df["quiz_id"].unique(),
-        default=df["quiz_id"].unique()
+        options=overview["quizzes"],
+        default=overview["quizzes"]
     )
     
-    if selected_quizzes:
-        filtered_df = filtered_df[filtered_df["quiz_id"].isin(selected_quizzes)]
+    if history is not None:
+        # Filtering and chart aggregates run in memory on the cached history
+        filtered_df = analysis_frames.filter_frame(history, start_date, end_date, selected_quizzes)
+        analysis = analysis_frames.summarize(filtered_df)
+        progression = filtered_df
+    else:
+        analysis = score_analytics.dashboard(
+            scores, student_id, start_date, end_date, selected_quizzes, analysis_frames.HEATMAP_QUIZZES
+        )
+        progression = analysis["progression"]
+
+    def attempt_rows(limit=None):
+        """Filtered attempts for the table and the CSV; limit keeps the latest of a long history."""
+        if history is not None:
+            return filtered_df.drop(columns="_id")
+        return score_analytics.attempts(scores, student_id, start_date, end_date, selected_quizzes, limit)
         
     st.divider()
     
-    # Download option
+    # Download option; the CSV is only built when the button is clicked
     if st.download_button(
         "Download Performance Data",
-        filtered_df.to_csv(index=False).encode('utf-8'),
+        lambda: attempt_rows().to_csv(index=False).encode('utf-8'),
         f"student_{student_id}_performance.csv",
         "text/csv"
     ):
@@ -150,25 +166,42 @@ with st.sidebar:
 # Key Performance Indicators
 st.subheader("📊 Key Performance Metrics")
 
+# All-time KPIs and insights come straight from the rollup; narrower filters use the aggregates
+showing_all = (start_date is None or (start_date <= min_date and end_date >= max_date)) and (
+    not selected_quizzes or set(selected_quizzes) >= set(overview["quizzes"])
+)
+if showing_all:
+    summary = score_rollups.summary(rollup)
+    quiz_stats = score_rollups.quiz_stats(rollup)
+else:
+    summary = analysis["summary"]
+    quiz_stats = analysis["quizzes"]
+
+if not summary["attempts"]:
+    st.info("No quiz attempts match the selected filters.")
+    st.stop()
+
 # KPI metrics in a row
 kpi1, kpi2, kpi3, kpi4 = st.columns(4)
 
-latest_score = df.iloc[-1]
-avg_accuracy = filtered_df["accuracy"].mean()
-total_quizzes = filtered_df["quiz_id"].nunique()
-performance_trend = "↗️ Improving" if filtered_df["accuracy"].iloc[-1] > filtered_df["accuracy"].iloc[0] else "↘️ Declining"
+avg_accuracy = summary["average"]
+total_quizzes = summary["quiz_count"]
+# Attempts with no questions have no accuracy and are left out of the KPIs and insights
+first_accuracy, last_accuracy = summary["first_accuracy"], summary["last_accuracy"]
+improving = first_accuracy is not None and last_accuracy is not None and last_accuracy > first_accuracy
+performance_trend = "↗️ Improving" if improving else "↘️ Declining"
 
 with kpi1:
     st.metric(
         "Latest Score",
-        f"{latest_score['score']} / {latest_score['total']}",
-        f"{latest_score['accuracy']:.1f}%"
+        f"{overview['latest_score']} / {overview['latest_total']}",
+        f"{overview['latest_accuracy']:.1f}%" if overview["latest_accuracy"] is not None else None
     )
 
 with kpi2:
     st.metric(
         "Average Accuracy",
-        f"{avg_accuracy:.1f}%"
+        f"{avg_accuracy:.1f}%" if avg_accuracy is not None else "–"
     )
 
 with kpi3:
@@ -183,256 +216,127 @@ with kpi4:
         performance_trend
     )
 
-# Create two columns for charts
-col1, col2 = st.columns(2)
-
-with col1:
-    st.subheader("📈 Score Progression")
-    
-    # Interactive line chart with range slider
-    fig = go.Figure()
-    
-    fig.add_trace(go.Scatter(
-        x=filtered_df["timestamp"],
-        y=filtered_df["score"],
-        mode='lines+markers',
-        name='Score',
-        line=dict(color='#4e54c8', width=3),
-        marker=dict(size=8)
-    ))
-    
-    fig.add_trace(go.Scatter(
-        x=filtered_df["timestamp"],
-        y=filtered_df["total"],
-        mode='lines',
-        name='Total Possible',
-        line=dict(color='#8f94fb', width=2, dash='dash')
-    ))
-    
-    fig.update_layout(
-        title='Score Progression Over Time',
-        height=400,
-        hovermode='x unified',
-        legend=dict(orientation='h', y=1.1),
-        xaxis=dict(
-            rangeslider=dict(visible=True),
-            type='date'
-        )
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
-
-with col2:
-    st.subheader("📊 Performance Distribution")
-    
-    # Performance category distribution
-    category_counts = filtered_df["performance_category"].value_counts().reset_index()
-    category_counts.columns = ["Category", "Count"]
-    
-    # Custom color scale based on categories
-    color_scale = {
-        "Needs Improvement": "#ff6b6b", 
-        "Satisfactory": "#ffd166", 
-        "Good": "#4ecdc4", 
-        "Excellent": "#06d6a0"
-    }
-    
-    colors = [color_scale.get(cat, "#000000") for cat in category_counts["Category"]]
-    
-    fig = go.Figure(data=[go.Pie(
-        labels=category_counts["Category"],
-        values=category_counts["Count"],
-        hole=.3,
-        marker=dict(colors=colors),
-        textinfo='label+percent',
-        hoverinfo='label+value',
-        textfont=dict(size=14)
-    )])
-    
-    fig.update_layout(
-        title="Performance Categories Distribution",
-        height=400
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
-
-# Performance heatmap by quiz
-st.subheader("🔥 Performance Heatmap by Quiz")
-
-# Create a pivot table for the heatmap
-if len(filtered_df) > 1:
-    # Create quiz performance heatmap
-    quiz_pivot = filtered_df.pivot_table(
-        index=filtered_df["timestamp"].dt.strftime('%Y-%m-%d'),
-        columns="quiz_id",
-        values="accuracy",
-        aggfunc="mean"
-    ).fillna(0)
-    
-    fig = px.imshow(
-        quiz_pivot,
-        labels=dict(x="Quiz ID", y="Date", color="Accuracy %"),
-        x=quiz_pivot.columns,
-        y=quiz_pivot.index,
-        color_continuous_scale="Blues",
-        aspect="auto",
-        text_auto=True
-    )
-    
-    fig.update_layout(
-        height=400,
-        xaxis=dict(side="top")
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
-else:
-    st.info("Not enough data to generate performance heatmap.")
-
-# Interactive quiz comparison
-st.subheader("🔄 Quiz Performance Comparison")
-
-# Bar chart with interactive elements
-fig = px.bar(
-    filtered_df,
-    x="quiz_id",
-    y="accuracy",
-    color="accuracy",
-    color_continuous_scale=["red", "yellow", "green"],
-    range_color=[0, 100],
-    labels={"accuracy": "Accuracy (%)", "quiz_id": "Quiz ID"},
-    text=filtered_df["score"].astype(str) + "/" + filtered_df["total"].astype(str),
-    hover_data=["timestamp", "score", "total"]
-)
-
-fig.update_layout(
-    height=400,
-    xaxis_title="Quiz ID",
-    yaxis_title="Accuracy (%)",
-    yaxis=dict(range=[0, 100]),
-    hovermode="closest"
-)
-
-fig.add_shape(
-    type="line",
-    x0=-0.5,
-    y0=avg_accuracy,
-    x1=len(filtered_df["quiz_id"].unique()) - 0.5,
-    y1=avg_accuracy,
-    line=dict(
-        color="black",
-        width=2,
-        dash="dash",
-    ),
-    name="Average"
-)
+# Charts are built only for the open tab, and their specs are cached until the data or filters change
+data_key = (subject_name, student_id, history_version, start_date, end_date, tuple(sorted(selected_quizzes)))
 
-fig.add_annotation(
-    x=len(filtered_df["quiz_id"].unique()) - 1,
-    y=avg_accuracy,
-    text=f"Average: {avg_accuracy:.1f}%",
-    showarrow=False,
-    yshift=10
+progress_tab, heatmap_tab, comparison_tab, table_tab, metrics_tab = st.tabs(
+    ["📈 Score Progression", "🔥 Heatmap", "🔄 Quiz Comparison", "📄 Data Table", "📊 Performance Metrics"],
+    key="analysis_tab",
+    on_change="rerun"
 )
 
-st.plotly_chart(fig, use_container_width=True)
-
-# Detailed data view with tabs
-st.subheader("📋 Detailed Performance Data")
-
-tab1, tab2 = st.tabs(["📄 Data Table", "📊 Performance Metrics"])
+with progress_tab:
+    if progress_tab.open:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.subheader("📈 Score Progression")
+            st.plotly_chart(
+                analysis_charts.figure_spec(
+                    data_key + ("progression",), lambda: analysis_charts.progression_figure(progression)
+                ),
+                use_container_width=True
+            )
 
-with tab1:
-    # Interactive data table with formatting
-    st.dataframe(
-        filtered_df[["quiz_id", "score", "total", "accuracy", "timestamp", "performance_category"]],
-        column_config={
-            "accuracy": st.column_config.ProgressColumn(
-                "Accuracy (%)",
-                format="%.1f%%",
-                min_value=0,
-                max_value=100
-            ),
-            "timestamp": st.column_config.DatetimeColumn(
-                "Date & Time",
-                format="MMM DD, YYYY - HH:mm"
-            ),
-            "performance_category": st.column_config.TextColumn(
-                "Performance Level"
+        with col2:
+            st.subheader("📊 Performance Distribution")
+            st.plotly_chart(
+                analysis_charts.figure_spec(
+                    data_key + ("categories",), lambda: analysis_charts.category_figure(analysis["categories"])
+                ),
+                use_container_width=True
             )
-        },
-        use_container_width=True,
-        hide_index=True
-    )
 
-with tab2:
-    metric_col1, metric_col2 = st.columns(2)
-    
-    with metric_col1:
-        # Time-based performance analysis
-        time_analysis = filtered_df.set_index("timestamp")
-        time_analysis = time_analysis.resample('D')['accuracy'].mean().reset_index()
-        time_analysis = time_analysis.dropna()
-        
-        if not time_analysis.empty:
-            fig = px.line(
-                time_analysis, 
-                x="timestamp", 
-                y="accuracy",
-                markers=True,
-                labels={"timestamp": "Date", "accuracy": "Average Accuracy (%)"},
-                title="Daily Average Performance"
+with heatmap_tab:
+    if heatmap_tab.open:
+        st.subheader("🔥 Performance Heatmap by Quiz")
+
+        if summary["attempts"] > 1:
+            st.plotly_chart(
+                analysis_charts.figure_spec(
+                    data_key + ("heatmap",), lambda: analysis_charts.heatmap_figure(analysis["heatmap"])
+                ),
+                use_container_width=True
             )
-            
-            fig.update_layout(height=300)
-            st.plotly_chart(fig, use_container_width=True)
         else:
-            st.info("Not enough time-series data for daily analysis.")
-    
-    with metric_col2:
-        # Progress towards mastery visualization
-        mastery_threshold = 90  # 90% accuracy considered mastery
-        
-        latest_accuracies = filtered_df.groupby("quiz_id")["accuracy"].last().reset_index()
-        
-        fig = go.Figure()
-        
-        for i, row in latest_accuracies.iterrows():
-            fig.add_trace(go.Indicator(
-                mode="gauge+number",
-                value=row["accuracy"],
-                domain={'x': [0, 1], 'y': [0, 1]},
-                title={'text': f"Quiz: {row['quiz_id']}"},
-                gauge={
-                    'axis': {'range': [0, 100]},
-                    'bar': {'color': "darkblue"},
-                    'steps': [
-                        {'range': [0, 60], 'color': "#ff6b6b"},
-                        {'range': [60, 75], 'color': "#ffd166"},
-                        {'range': [75, 90], 'color': "#4ecdc4"},
-                        {'range': [90, 100], 'color': "#06d6a0"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': mastery_threshold
-                    }
-                }
-            ))
-        
-        fig.update_layout(
-            grid={'rows': 1, 'columns': min(3, len(latest_accuracies))},
-            height=300,
-            title_text="Progress Towards Mastery (90%)"
+            st.info("Not enough data to generate performance heatmap.")
+
+with comparison_tab:
+    if comparison_tab.open:
+        st.subheader("🔄 Quiz Performance Comparison")
+        st.plotly_chart(
+            analysis_charts.figure_spec(
+                data_key + ("comparison", showing_all),
+                lambda: analysis_charts.comparison_figure(quiz_stats, avg_accuracy)
+            ),
+            use_container_width=True
+        )
+
+with table_tab:
+    if table_tab.open:
+        st.subheader("📋 Detailed Performance Data")
+
+        # Interactive data table with formatting; long histories show their latest attempts
+        table_rows = attempt_rows(TABLE_ROWS)
+        if len(table_rows) < summary["attempts"]:
+            st.caption(f"Latest {len(table_rows):,} of {summary['attempts']:,} attempts; download the CSV for all of them.")
+        st.dataframe(
+            table_rows[["quiz_id", "score", "total", "accuracy", "timestamp", "performance_category"]],
+            column_config={
+                "accuracy": st.column_config.ProgressColumn(
+                    "Accuracy (%)",
+                    format="%.1f%%",
+                    min_value=0,
+                    max_value=100
+                ),
+                "timestamp": st.column_config.DatetimeColumn(
+                    "Date & Time",
+                    format="MMM DD, YYYY - HH:mm"
+                ),
+                "performance_category": st.column_config.TextColumn(
+                    "Performance Level"
+                )
+            },
+            use_container_width=True,
+            hide_index=True
         )
-        
-        st.plotly_chart(fig, use_container_width=True)
+
+with metrics_tab:
+    if metrics_tab.open:
+        metric_col1, metric_col2 = st.columns(2)
+
+        with metric_col1:
+            # Time-based performance analysis
+            if not analysis["daily"].empty:
+                st.plotly_chart(
+                    analysis_charts.figure_spec(
+                        data_key + ("daily",), lambda: analysis_charts.daily_figure(analysis["daily"])
+                    ),
+                    use_container_width=True
+                )
+            else:
+                st.info("Not enough time-series data for daily analysis.")
+
+        with metric_col2:
+            # Progress towards mastery, a page of quizzes at a time
+            gauge_pages = analysis_charts.gauge_pages(len(quiz_stats))
+            gauge_page = 1
+            if gauge_pages > 1:
+                gauge_page = st.number_input("Quiz page", min_value=1, max_value=gauge_pages, value=1)
+            st.plotly_chart(
+                analysis_charts.figure_spec(
+                    data_key + ("gauges", showing_all, gauge_page),
+                    lambda: analysis_charts.gauge_figure(quiz_stats, gauge_page)
+                ),
+                use_container_width=True
+            )
 
 # Recommendations section based on performance
 st.subheader("💡 Performance Insights & Recommendations")
 
 # Simple recommendation logic
-recent_performance = filtered_df.sort_values("timestamp").tail(3)["accuracy"].mean()
-overall_performance = filtered_df["accuracy"].mean()
+recent_performance = summary["recent_average"]
+overall_performance = avg_accuracy
 
 insight_col1, insight_col2 = st.columns(2)
 
@@ -442,7 +346,9 @@ with insight_col1:
         <h4>Performance Trend Analysis</h4>
     """, unsafe_allow_html=True)
     
-    if recent_performance > overall_performance + 5:
+    if recent_performance is None or overall_performance is None:
+        st.info("📊 Not enough scored attempts to analyse your trend yet.")
+    elif recent_performance > overall_performance + 5:
         st.success("📈 Your recent performance shows significant improvement! Keep up the good work.")
     elif recent_performance < overall_performance - 5:
         st.warning("📉 Your recent performance has declined. Consider reviewing earlier materials.")
@@ -450,13 +356,13 @@ with insight_col1:
         st.info("📊 Your performance has been consistent. Focus on specific areas to improve.")
     
     # Find strongest and weakest quizzes
-    if len(filtered_df) > 1:
-        quiz_avg = filtered_df.groupby("quiz_id")["accuracy"].mean().reset_index()
-        best_quiz = quiz_avg.loc[quiz_avg["accuracy"].idxmax()]
-        worst_quiz = quiz_avg.loc[quiz_avg["accuracy"].idxmin()]
+    quiz_avg = quiz_stats.dropna(subset=["average"])
+    if summary["attempts"] > 1 and len(quiz_avg):
+        best_quiz = quiz_avg.loc[quiz_avg["average"].idxmax()]
+        worst_quiz = quiz_avg.loc[quiz_avg["average"].idxmin()]
         
-        st.markdown(f"**Strongest Performance**: Quiz {best_quiz['quiz_id']} ({best_quiz['accuracy']:.1f}%)")
-        st.markdown(f"**Needs Improvement**: Quiz {worst_quiz['quiz_id']} ({worst_quiz['accuracy']:.1f}%)")
+        st.markdown(f"**Strongest Performance**: Quiz {best_quiz['quiz_id']} ({best_quiz['average']:.1f}%)")
+        st.markdown(f"**Needs Improvement**: Quiz {worst_quiz['quiz_id']} ({worst_quiz['average']:.1f}%)")
     
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -467,21 +373,27 @@ with insight_col2:
     """, unsafe_allow_html=True)
     
     # Simple recommendation system
-    below_threshold = filtered_df[filtered_df["accuracy"] < 75]
+    below_threshold = quiz_stats[quiz_stats["below_attempts"] > 0]
     
     if not below_threshold.empty:
         st.markdown("**Focus Areas for Improvement:**")
-        for quiz in below_threshold["quiz_id"].unique():
-            accuracy = below_threshold[below_threshold["quiz_id"] == quiz]["accuracy"].mean()
-            st.markdown(f"- Review material for Quiz {quiz} ({accuracy:.1f}%)")
+        for _, quiz in below_threshold.iterrows():
+            st.markdown(f"- Review material for Quiz {quiz['quiz_id']} ({quiz['below_average']:.1f}%)")
     else:
         st.success("Great job! All quiz scores are above the satisfactory threshold.")
     
-    if recent_performance > 90:
+    if recent_performance is not None and recent_performance > 90:
         st.markdown("**Next Steps**: Consider taking more advanced quizzes to challenge yourself.")
     
     st.markdown("</div>", unsafe_allow_html=True)
 
+frame_stats = analysis_frames.get_frame_cache().stats()
+st.caption(
+    f"Analysis cache: {frame_stats['entries']} histories, {frame_stats['bytes'] / 2**20:.1f} of "
+    f"{frame_stats['budget_bytes'] / 2**20:.0f} MB; {frame_stats['hits']} hits, "
+    f"{frame_stats['refreshes']} incremental refreshes, {frame_stats['full_loads']} full loads"
+)
+
 # Footer with attribution
 st.markdown("""
 ---
@@ -0,0 +1,88 @@
+"""Streaming, optionally parallel PDF text extraction.
+
+Pages are yielded one at a time and joined once at the end, instead of
+growing a string page by page. PDFs with at least `parallel_threshold` pages
+are split into page ranges that a process pool extracts in parallel; results
+are consumed in page order so progress can be reported as ranges finish.
+Extraction stops once `max_chars` characters have been collected, so a huge
+upload cannot exhaust the server's memory.
+"""
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", str(20_000_000)))
+PARALLEL_THRESHOLD = int(os.getenv("PDF_PARALLEL_THRESHOLD", "40"))
+PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "20"))
+
+_worker_reader = None
+
+
+class TextLimitExceeded(Exception):
+    pass
+
+
+def _init_worker(data):
+    # Each worker parses the document once and then serves many page ranges
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(data))
+
+
+def _extract_range(page_range):
+    start, stop = page_range
+    return [(_worker_reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def iter_page_text(reader, start=0, stop=None):
+    """Yield the text of each page in [start, stop)."""
+    stop = len(reader.pages) if stop is None else stop
+    for i in range(start, stop):
+        yield reader.pages[i].extract_text() or ""
+
+
+def _page_ranges(page_count, pages_per_chunk):
+    return [(start, min(start + pages_per_chunk, page_count))
+            for start in range(0, page_count, pages_per_chunk)]
+
+
+def iter_pdf_pages(data, progress=None, workers=None,
+                   parallel_threshold=PARALLEL_THRESHOLD, pages_per_chunk=PAGES_PER_CHUNK):
+    """Yield page texts in order, calling progress(done, total) as pages complete."""
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+
+    if page_count < parallel_threshold or (workers or os.cpu_count() or 1) < 2:
+        for done, text in enumerate(iter_page_text(reader), start=1):
+            if progress:
+                progress(done, page_count)
+            yield text
+        return
+
+    ranges = _page_ranges(page_count, pages_per_chunk)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(data,)) as pool:
+        done = 0
+        try:
+            for texts in pool.map(_extract_range, ranges):
+                done += len(texts)
+                if progress:
+                    progress(done, page_count)
+                yield from texts
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_text(data, progress=None, workers=None, max_chars=MAX_CHARS, **kwargs):
+    """Return the document's text, one line break after each page and a form feed before the next."""
+    parts = []
+    collected = 0
+    for text in iter_pdf_pages(data, progress=progress, workers=workers, **kwargs):
+        collected += len(text) + 2
+        if collected > max_chars:
+            raise TextLimitExceeded(f"Document text exceeds {max_chars:,} characters")
+        parts.append(text)
+    return "\n\f".join(parts) + "\n" if parts else ""
@@ -0,0 +1,194 @@
+"""Token-aware packing of document text into a prompt budget.
+
+Instead of cutting the document at a fixed character count, the text is
+normalised (whitespace collapsed, running headers/footers and page-number
+lines removed from the edges of PDF pages, repeated blocks dropped), split
+into paragraph-sized blocks, and the highest-value blocks are packed up to
+an exact token budget. The chosen blocks are emitted in document order.
+
+Token counts come from tiktoken when it is installed; otherwise a regex
+word/punctuation split is used as a close local approximation.
+"""
+import math
+import re
+from collections import Counter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+ENCODING_NAME = "o200k_base"  # gpt-4o family
+BLOCK_TOKENS = 150
+BLOCK_SEPARATOR = "\n\n"
+PAGE_BREAK = "\f"  # pdf_extract starts each page after the first with a form feed
+EDGE_LINES = 2  # lines at the top and bottom of a page checked for headers and footers
+
+_PAGE_NUMBER = re.compile(r"^\s*(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?\s*$", re.IGNORECASE)
+_FALLBACK_TOKEN = re.compile(r"\w+|[^\w\s]")
+_TERM = re.compile(r"[a-z][a-z0-9\-]{2,}")
+STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has have him his how its may new now
+    old see two way who did get let put say she too use that with this from they will would there their
+    what about which when make like time just know take into year your good some could them than then
+    look only come over also back after work first well even want because these give most such been were
+    more very each other where those many should while being through between both under
+""".split())
+
+_encoder = None
+
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None and tiktoken is not None:
+        try:
+            _encoder = tiktoken.get_encoding(ENCODING_NAME)
+        except Exception:
+            _encoder = False
+    return _encoder or None
+
+
+def count_tokens(text):
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(_FALLBACK_TOKEN.findall(text))
+
+
+class PackedText:
+    def __init__(self, text, tokens, source_tokens, blocks_used, blocks_total):
+        self.text = text
+        self.tokens = tokens
+        self.source_tokens = source_tokens
+        self.blocks_used = blocks_used
+        self.blocks_total = blocks_total
+
+    @property
+    def coverage(self):
+        return self.blocks_used / self.blocks_total if self.blocks_total else 1.0
+
+
+def _page_edges(lines, count=EDGE_LINES):
+    """Indexes of the first and last few non-blank lines of a page."""
+    filled = [i for i, line in enumerate(lines) if line]
+    return set(filled[:count] + filled[-count:])
+
+
+def normalize(text):
+    """Collapse whitespace; in paginated text, also drop page numbers and running headers/footers.
+
+    Only PDF text is paginated (pages separated by form feeds), and only the
+    first and last lines of a page are candidates: a number-only line there,
+    or a short line found at the edge of at least 3 pages.
+    """
+    pages = [
+        [re.sub(r"[ \t\f\v]+", " ", line).strip() for line in page.splitlines()]
+        for page in text.split(PAGE_BREAK)
+    ]
+    edges = [_page_edges(lines) if len(pages) > 1 else set() for lines in pages]
+    counts = Counter(
+        line for lines, edge in zip(pages, edges) for line in {lines[i] for i in edge} if len(line) < 80
+    )
+    boilerplate = {line for line, count in counts.items() if count >= 3}
+
+    kept = []
+    for lines, edge in zip(pages, edges):
+        for i, line in enumerate(lines):
+            if i in edge and (line in boilerplate or _PAGE_NUMBER.match(line)):
+                continue
+            if not line and (not kept or not kept[-1]):
+                continue
+            kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def _split_long_lines(lines, block_tokens):
+    # Text without line breaks (e.g. a one-line .txt) is cut at word boundaries
+    max_chars = block_tokens * 6
+    for line in lines:
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            yield line[:cut]
+            line = line[cut:].lstrip()
+        yield line
+
+
+def split_blocks(text, block_tokens=BLOCK_TOKENS):
+    """Group lines into paragraph-sized blocks, breaking at blank lines or sentence ends."""
+    blocks = []
+    current = []
+    size = 0
+    for line in _split_long_lines(text.split("\n"), block_tokens):
+        if not line:
+            if current:
+                blocks.append(" ".join(current))
+                current, size = [], 0
+            continue
+        current.append(line)
+        size += count_tokens(line)
+        # Prefer to end blocks at a sentence, but cap runaway blocks without punctuation
+        if size >= block_tokens and line.endswith((".", "?", "!", ":")) or size >= block_tokens * 4:
+            blocks.append(" ".join(current))
+            current, size = [], 0
+    if current:
+        blocks.append(" ".join(current))
+
+    # Identical blocks (repeated boilerplate paragraphs, duplicated slides) are kept once
+    seen = set()
+    unique = []
+    for block in blocks:
+        key = re.sub(r"\W+", " ", block.lower()).strip()
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(block)
+    return unique
+
+
+def _block_terms(block):
+    return {term for term in _TERM.findall(block.lower()) if term not in STOPWORDS}
+
+
+def score_blocks(blocks, block_tokens):
+    """Score blocks by how many recurring concept terms they pack per token."""
+    terms = [_block_terms(block) for block in blocks]
+    document_frequency = Counter(term for block_terms in terms for term in block_terms)
+
+    scores = []
+    for block, block_terms, tokens in zip(blocks, terms, block_tokens):
+        letters = sum(char.isalpha() for char in block)
+        alpha_ratio = letters / len(block) if block else 0.0
+        weight = sum(math.log1p(document_frequency[term]) for term in block_terms)
+        scores.append(alpha_ratio * weight / math.sqrt(1 + tokens))
+    return scores
+
+
+def pack(text, token_budget):
+    """Return a PackedText holding the best blocks of text within token_budget."""
+    blocks = split_blocks(normalize(text))
+    block_tokens = [count_tokens(block) for block in blocks]
+    source_tokens = sum(block_tokens)
+    separator_tokens = count_tokens(BLOCK_SEPARATOR)
+
+    scores = score_blocks(blocks, block_tokens)
+    if source_tokens + separator_tokens * max(0, len(blocks) - 1) <= token_budget:
+        chosen = list(range(len(blocks)))
+    else:
+        chosen = []
+        used = 0
+        for i in sorted(range(len(blocks)), key=lambda i: scores[i], reverse=True):
+            cost = block_tokens[i] + (separator_tokens if chosen else 0)
+            if used + cost <= token_budget:
+                chosen.append(i)
+                used += cost
+        chosen.sort()
+
+    packed = BLOCK_SEPARATOR.join(blocks[i] for i in chosen)
+    tokens = count_tokens(packed)
+    # Tokenisation across block joins can differ slightly; trim until it fits exactly
+    while tokens > token_budget and chosen:
+        chosen.remove(min(chosen, key=lambda i: scores[i]))
+        packed = BLOCK_SEPARATOR.join(blocks[i] for i in chosen)
+        tokens = count_tokens(packed)
+
+    return PackedText(packed, tokens, source_tokens, len(chosen), len(blocks))
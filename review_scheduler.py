@@ -0,0 +1,241 @@
+"""SM-2 spaced-repetition scheduling for flashcard decks.
+
+Every answered card gets a review document in `master_db.card_reviews`
+holding its SM-2 state (ease factor, interval, repetition count) and the time
+it is next due. The `student_deck_due` index makes "next N due cards" a single
+index range scan however large the deck or review history is.
+
+Answers are buffered and written in one ordered bulk write every
+`REVIEW_FLUSH_INTERVAL` seconds (or `REVIEW_FLUSH_SIZE` answers). Each write is
+an update pipeline that applies the SM-2 step to the stored state on the
+server, so recording an answer never needs a read and costs the same however
+many reviews a card already has. A batch that fails on a lost upsert race is
+retried from the failed review; any other failed review is dropped so it
+cannot hold up later ones, and counted in `stats()`.
+
+Reviews are keyed by the card's index in its deck, so regenerating a deck
+(which keeps its ID but replaces its cards) resets the deck's reviews.
+"""
+import os
+import threading
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+import database
+
+REVIEW_DB = "master_db"
+REVIEW_COLLECTION = "card_reviews"
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+DAY_MS = 24 * 3600 * 1000
+CORRECT_QUALITY = 4  # SM-2 grades 0-5; a correct multiple-choice answer counts as "correct after hesitation"
+INCORRECT_QUALITY = 1
+DUPLICATE_KEY = 11000
+
+_log = None
+_log_lock = threading.Lock()
+_indexes_ready = False
+
+
+def get_review_collection(client):
+    global _indexes_ready
+    collection = client[REVIEW_DB][REVIEW_COLLECTION]
+    if not _indexes_ready:
+        collection.create_index(
+            [("student_id", ASCENDING), ("deck_id", ASCENDING), ("card", ASCENDING)],
+            unique=True,
+            name="student_deck_card"
+        )
+        collection.create_index(
+            [("student_id", ASCENDING), ("deck_id", ASCENDING), ("due_at", ASCENDING)],
+            name="student_deck_due"
+        )
+        _indexes_ready = True
+    return collection
+
+
+def sm2_update(quality, reviewed_at):
+    """Update pipeline applying one SM-2 review of the given quality (0-5)."""
+    ease = {"$ifNull": ["$ease", DEFAULT_EASE]}
+    repetitions = {"$ifNull": ["$repetitions", 0]}
+    interval = {"$ifNull": ["$interval_days", 0]}
+
+    if quality >= 3:
+        # 1 day, then 6 days, then the previous interval times the ease factor
+        next_interval = {"$switch": {
+            "branches": [
+                {"case": {"$eq": [repetitions, 0]}, "then": 1},
+                {"case": {"$eq": [repetitions, 1]}, "then": 6},
+            ],
+            "default": {"$round": [{"$multiply": [interval, ease]}, 0]},
+        }}
+        next_repetitions = {"$add": [repetitions, 1]}
+    else:
+        next_interval = 1
+        next_repetitions = 0
+
+    ease_change = 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return [
+        # One stage, so every expression sees the state before this review
+        {"$set": {
+            "ease": {"$max": [MIN_EASE, {"$add": [ease, ease_change]}]},
+            "repetitions": next_repetitions,
+            "interval_days": next_interval,
+            "lapses": {"$add": [{"$ifNull": ["$lapses", 0]}, 0 if quality >= 3 else 1]},
+            "reviews": {"$add": [{"$ifNull": ["$reviews", 0]}, 1]},
+            "last_quality": quality,
+            "last_reviewed_at": reviewed_at,
+        }},
+        {"$set": {"due_at": {"$add": [reviewed_at, {"$multiply": ["$interval_days", DAY_MS]}]}}},
+    ]
+
+
+class ReviewLog:
+    def __init__(self, client, flush_size=200, flush_interval=5.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.writes = 0
+        self.flush_errors = 0
+        self.dropped = 0
+        self.last_flush_error = None
+        self._client = client
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="review-log", daemon=True)
+        self._thread.start()
+
+    def record(self, student_id, deck_id, card, correct, reviewed_at=None):
+        """Buffer one review outcome; written with the next batch."""
+        with self._lock:
+            self._pending.append((student_id, deck_id, card, correct, reviewed_at or datetime.utcnow()))
+            if len(self._pending) >= self.flush_size:
+                self._wake.set()
+
+    def has_pending(self, student_id, deck_id):
+        with self._lock:
+            return any(review[0] == student_id and review[1] == deck_id for review in self._pending)
+
+    def discard(self, deck_id):
+        """Drop buffered reviews of a deck whose cards were replaced."""
+        with self._lock:
+            self._pending = [review for review in self._pending if review[1] != deck_id]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+
+            ops = [
+                UpdateOne(
+                    {"student_id": student_id, "deck_id": deck_id, "card": card},
+                    sm2_update(CORRECT_QUALITY if correct else INCORRECT_QUALITY, reviewed_at),
+                    upsert=True
+                )
+                for student_id, deck_id, card, correct, reviewed_at in pending
+            ]
+            try:
+                # Ordered, so repeated reviews of one card apply in the order they happened
+                result = get_review_collection(self._client).bulk_write(ops, ordered=True)
+            except BulkWriteError as e:
+                # Writes stop at the first error. A lost upsert race succeeds when retried;
+                # any other failed review is dropped so it cannot block the ones after it.
+                error = e.details["writeErrors"][0]
+                failed = error["index"]
+                self._fail(error.get("errmsg", str(e)))
+                if error.get("code") != DUPLICATE_KEY:
+                    failed += 1
+                    self.dropped += 1
+                self._requeue(pending[failed:])
+                return e.details.get("nMatched", 0) + e.details.get("nUpserted", 0)
+            except PyMongoError as e:
+                self._fail(str(e))
+                self._requeue(pending)
+                return 0
+            self.writes += 1
+            return result.matched_count + result.upserted_count
+
+    def _fail(self, message):
+        self.flush_errors += 1
+        self.last_flush_error = message
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "writes": self.writes,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+            "last_flush_error": self.last_flush_error,
+        }
+
+    def _requeue(self, reviews):
+        with self._lock:
+            self._pending[:0] = reviews
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self._fail(str(e))
+
+
+def get_review_log():
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = ReviewLog(
+                    database.get_client(),
+                    flush_size=int(os.getenv("REVIEW_FLUSH_SIZE", "200")),
+                    flush_interval=float(os.getenv("REVIEW_FLUSH_INTERVAL", "5.0")),
+                )
+    return _log
+
+
+def reset_deck(client, deck_id):
+    """Forget every student's reviews of a regenerated deck, whose card indexes now name other cards."""
+    get_review_log().discard(deck_id)
+    return get_review_collection(client).delete_many({"deck_id": deck_id}).deleted_count
+
+
+def due_cards(client, student_id, deck_id, limit=20, now=None):
+    """Return up to limit card indexes that are due, most overdue first (one indexed query)."""
+    cursor = get_review_collection(client).find(
+        {"student_id": student_id, "deck_id": deck_id, "due_at": {"$lte": now or datetime.utcnow()}},
+        {"_id": 0, "card": 1}
+    ).sort("due_at", ASCENDING).limit(limit).hint("student_deck_due")
+    return [doc["card"] for doc in cursor]
+
+
+def review_queue(client, student_id, deck_id, card_count, limit=20):
+    """Return (cards to study, next due time): due cards first, then cards never reviewed."""
+    log = get_review_log()
+    if log.has_pending(student_id, deck_id):
+        log.flush()
+
+    queue = due_cards(client, student_id, deck_id, limit)
+    if len(queue) < limit:
+        collection = get_review_collection(client)
+        reviewed = set(collection.distinct("card", {"student_id": student_id, "deck_id": deck_id}))
+        queue += [card for card in range(card_count) if card not in reviewed][:limit - len(queue)]
+
+    next_due = None
+    if not queue:
+        upcoming = get_review_collection(client).find_one(
+            {"student_id": student_id, "deck_id": deck_id},
+            {"_id": 0, "due_at": 1},
+            sort=[("due_at", ASCENDING)],
+            hint="student_deck_due"
+        )
+        next_due = upcoming["due_at"] if upcoming else None
+    return queue, next_due
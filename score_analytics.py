@@ -0,0 +1,226 @@
+"""Aggregation queries behind the student analysis dashboard.
+
+Each function runs a student's chart computations as MongoDB aggregation
+stages and returns only what the charts draw: a handful of KPI numbers, one
+row per category, per (day, quiz) cell, per day and per quiz. `dashboard`
+computes all of them in one `$facet` round trip over the `student_timestamp`
+index, so its cost on the app server does not grow with the history. The
+analysis page uses it for histories too long to cache in memory (see
+`analysis_frames.MAX_ROWS`) and while a student's cached history is still
+loading; its result has the same shape as `analysis_frames.summarize`.
+
+`$dateTrunc` needs MongoDB 5.0 or later.
+"""
+from datetime import datetime, time, timedelta
+
+import pandas as pd
+from pymongo import ASCENDING, DESCENDING
+
+SCORES_COLLECTION = "test_scores"
+CATEGORY_BINS = [0, 60, 75, 90, 100]
+CATEGORY_LABELS = ["Needs Improvement", "Satisfactory", "Good", "Excellent"]
+SATISFACTORY_ACCURACY = 75
+RECENT_ATTEMPTS = 3
+
+ACCURACY = {"$cond": [
+    {"$gt": ["$total", 0]},
+    {"$multiply": [{"$divide": ["$score", "$total"]}, 100]},
+    None,
+]}
+DAY = {"$dateTrunc": {"date": "$timestamp", "unit": "day"}}
+SCORED = {"$cond": [{"$eq": ["$accuracy", None]}, 0, 1]}
+# null sorts below every number, so unscored attempts are excluded explicitly
+BELOW = {"$and": [{"$ne": ["$accuracy", None]}, {"$lt": ["$accuracy", SATISFACTORY_ACCURACY]}]}
+
+_indexed = set()
+
+
+def get_scores_collection(client, subject):
+    collection = client[subject][SCORES_COLLECTION]
+    if subject not in _indexed:
+        collection.create_index([("student_id", ASCENDING), ("timestamp", ASCENDING)], name="student_timestamp")
+        _indexed.add(subject)
+    return collection
+
+
+def match_stage(student_id, start_date=None, end_date=None, quiz_ids=None):
+    """$match for a student's attempts between two dates (inclusive) and in the given quizzes."""
+    query = {"student_id": student_id}
+    if start_date is not None and end_date is not None:
+        query["timestamp"] = {
+            "$gte": datetime.combine(start_date, time.min),
+            "$lt": datetime.combine(end_date + timedelta(days=1), time.min),
+        }
+    if quiz_ids:
+        query["quiz_id"] = {"$in": list(quiz_ids)}
+    return {"$match": query}
+
+
+def categorize(accuracy):
+    """Performance category for each accuracy value, as the dashboard labels them."""
+    return pd.cut(accuracy, bins=CATEGORY_BINS, labels=CATEGORY_LABELS)
+
+
+def overview(collection, student_id):
+    """Attempt count, date range, quizzes and latest attempt for the filter sidebar; None if no attempts."""
+    result = list(collection.aggregate([
+        {"$match": {"student_id": student_id}},
+        {"$sort": {"timestamp": DESCENDING}},
+        {"$group": {
+            "_id": None,
+            "attempts": {"$sum": 1},
+            "first_attempt": {"$last": "$timestamp"},
+            "last_attempt": {"$first": "$timestamp"},
+            "quizzes": {"$addToSet": "$quiz_id"},
+            "latest_score": {"$first": "$score"},
+            "latest_total": {"$first": "$total"},
+            "latest_accuracy": {"$first": ACCURACY},
+        }},
+    ]))
+    if not result:
+        return None
+    summary = result[0]
+    summary.pop("_id", None)
+    summary["quizzes"] = sorted(summary["quizzes"])
+    return summary
+
+
+def _category_stage():
+    # pd.cut bins are closed on the right ((60, 75] is "Satisfactory") but $bucket
+    # ranges are closed on the left, so bucket the negated accuracy instead.
+    # Accuracy 0 and unscored attempts land in no bin, as they do with pd.cut.
+    boundaries = [-bound for bound in reversed(CATEGORY_BINS)]
+    return {"$bucket": {
+        "groupBy": {"$multiply": [-1, {"$ifNull": ["$accuracy", -1]}]},
+        "boundaries": boundaries,
+        "default": "uncategorized",
+        "output": {"count": {"$sum": 1}},
+    }}
+
+
+def dashboard(collection, student_id, start_date=None, end_date=None, quiz_ids=None, heatmap_quizzes=None):
+    """Every aggregate the dashboard draws for the filtered attempts, in one round trip.
+
+    Also returns "progression", the mean score and total per day, which the
+    score progression chart draws in place of individual attempts. The
+    heatmap keeps the heatmap_quizzes most attempted quizzes and folds the
+    rest into "other", as `analysis_frames.summarize` does.
+    """
+    result = list(collection.aggregate([
+        match_stage(student_id, start_date, end_date, quiz_ids),
+        {"$project": {"_id": 0, "quiz_id": 1, "score": 1, "total": 1, "timestamp": 1, "accuracy": ACCURACY}},
+        {"$sort": {"timestamp": ASCENDING}},
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "attempts": {"$sum": 1},
+                "average": {"$avg": "$accuracy"},
+                "quizzes": {"$addToSet": "$quiz_id"},
+                "first_accuracy": {"$first": "$accuracy"},
+                "last_accuracy": {"$last": "$accuracy"},
+            }}],
+            "recent": [
+                {"$sort": {"timestamp": DESCENDING}},
+                {"$limit": RECENT_ATTEMPTS},
+                {"$group": {"_id": None, "average": {"$avg": "$accuracy"}}},
+            ],
+            "categories": [_category_stage()],
+            "heatmap": [
+                {"$group": {
+                    "_id": {"day": DAY, "quiz_id": "$quiz_id"},
+                    "sum": {"$sum": "$accuracy"},
+                    "count": {"$sum": SCORED},
+                }},
+            ],
+            "daily": [
+                {"$group": {"_id": DAY, "accuracy": {"$avg": "$accuracy"}}},
+                {"$sort": {"_id": ASCENDING}},
+            ],
+            "progression": [
+                {"$group": {"_id": DAY, "score": {"$avg": "$score"}, "total": {"$avg": "$total"}}},
+                {"$sort": {"_id": ASCENDING}},
+            ],
+            "quizzes": [
+                {"$group": {
+                    "_id": "$quiz_id",
+                    "attempts": {"$sum": 1},
+                    "average": {"$avg": "$accuracy"},
+                    "last_accuracy": {"$last": "$accuracy"},
+                    "below_attempts": {"$sum": {"$cond": [BELOW, 1, 0]}},
+                    "below_average": {"$avg": {"$cond": [BELOW, "$accuracy", None]}},
+                }},
+                {"$sort": {"_id": ASCENDING}},
+            ],
+        }},
+    ]))
+    return _frames(result[0], heatmap_quizzes)
+
+
+def _heatmap(cells, quizzes, heatmap_quizzes):
+    """Mean accuracy per day and quiz; the heatmap_quizzes most attempted quizzes (all if None), the rest as "other"."""
+    if heatmap_quizzes is None:
+        heatmap_quizzes = len(quizzes)
+    top = quizzes.sort_values("attempts", ascending=False, kind="stable")["quiz_id"].head(heatmap_quizzes)
+    columns = sorted(top) + (["other"] if len(quizzes) > len(top) else [])
+    cells = cells.assign(quiz_id=cells["quiz_id"].where(cells["quiz_id"].isin(set(top)), "other"))
+    totals = cells.groupby(["day", "quiz_id"])[["sum", "count"]].sum()
+    heatmap = (totals["sum"] / totals["count"].where(totals["count"] > 0)).unstack("quiz_id")
+    heatmap = heatmap.reindex(columns=pd.Index(columns, name="quiz_id")).sort_index()
+    heatmap.index = pd.Index(pd.to_datetime(heatmap.index).strftime("%Y-%m-%d"), name="timestamp")
+    return heatmap
+
+
+def _frames(facets, heatmap_quizzes):
+    """Turn the $facet output into the small frames the charts take."""
+    summary = facets["summary"][0] if facets["summary"] else {
+        "attempts": 0, "average": None, "quizzes": [], "first_accuracy": None, "last_accuracy": None
+    }
+    summary["quiz_count"] = len(summary.pop("quizzes"))
+    summary.pop("_id", None)
+    summary["recent_average"] = facets["recent"][0]["average"] if facets["recent"] else None
+
+    bucket_labels = dict(zip((-bound for bound in reversed(CATEGORY_BINS)), reversed(CATEGORY_LABELS)))
+    categories = pd.DataFrame(
+        [(bucket_labels[row["_id"]], row["count"]) for row in facets["categories"] if row["_id"] in bucket_labels],
+        columns=["Category", "Count"]
+    ).sort_values("Count", ascending=False, ignore_index=True)
+
+    quizzes = pd.DataFrame(facets["quizzes"], columns=[
+        "_id", "attempts", "average", "last_accuracy", "below_attempts", "below_average"
+    ]).rename(columns={"_id": "quiz_id"})
+
+    cells = pd.DataFrame(
+        [(row["_id"]["day"], row["_id"]["quiz_id"], row["sum"], row["count"]) for row in facets["heatmap"]],
+        columns=["day", "quiz_id", "sum", "count"]
+    )
+    heatmap = _heatmap(cells, quizzes, heatmap_quizzes)
+
+    daily = pd.DataFrame(
+        [(row["_id"], row["accuracy"]) for row in facets["daily"] if row["accuracy"] is not None],
+        columns=["timestamp", "accuracy"]
+    )
+    daily["timestamp"] = pd.to_datetime(daily["timestamp"])
+    progression = pd.DataFrame(
+        [(row["_id"], row["score"], row["total"]) for row in facets["progression"]],
+        columns=["timestamp", "score", "total"]
+    )
+    progression["timestamp"] = pd.to_datetime(progression["timestamp"])
+
+    return {"summary": summary, "categories": categories, "heatmap": heatmap, "daily": daily,
+            "quizzes": quizzes, "progression": progression}
+
+
+def attempts(collection, student_id, start_date=None, end_date=None, quiz_ids=None, limit=None):
+    """The filtered attempts, oldest first and without stored answers; only the latest limit if given."""
+    pipeline = [match_stage(student_id, start_date, end_date, quiz_ids)]
+    if limit is not None:
+        pipeline += [{"$sort": {"timestamp": DESCENDING}}, {"$limit": limit}]
+    pipeline += [
+        {"$sort": {"timestamp": ASCENDING}},
+        {"$project": {"_id": 0, "quiz_id": 1, "score": 1, "total": 1, "timestamp": 1, "accuracy": ACCURACY}},
+    ]
+    rows = list(collection.aggregate(pipeline))
+    df = pd.DataFrame(rows, columns=["quiz_id", "score", "total", "accuracy", "timestamp"])
+    df["accuracy"] = df["accuracy"].astype(float)
+    df["performance_category"] = categorize(df["accuracy"])
+    return df
@@ -0,0 +1,253 @@
+"""Per-student score rollups, maintained as scores are written.
+
+Each subject database has a `score_rollups` collection with one document per
+student: attempt count, scored attempt count and accuracy sum, earliest
+attempt, the last `ROLLUP_RECENT_ATTEMPTS` attempts, per-quiz
+count/sum/best/latest and performance category counts. Attempts with no
+questions are counted but leave the accuracy figures alone, as they do in
+`analysis_frames.summarize`. Every score the write-behind writer persists
+updates its student's rollup with a single upsert built from `$inc`, `$min`,
+`$max` and `$push` with `$sort`/`$slice`, so the update is atomic and never
+reads the student's history. The analysis page renders its KPIs and insights
+from that one document.
+
+A student's first rollup is rebuilt from their whole history, so scores
+written before rollups existed are counted. A rollup can still fall behind
+if the process dies between writing a score and updating the rollup.
+`rebuild` recomputes rollups from raw history:
+
+    python score_rollups.py <subject> [student_id]
+"""
+import itertools
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+
+from score_analytics import CATEGORY_BINS, CATEGORY_LABELS, RECENT_ATTEMPTS, SATISFACTORY_ACCURACY, SCORES_COLLECTION
+
+ROLLUP_COLLECTION = "score_rollups"
+RECENT_LIMIT = int(os.getenv("ROLLUP_RECENT_ATTEMPTS", "20"))
+REBUILD_BATCH = 500
+# Rollups written by older code are rebuilt when a student's rollup is read
+ROLLUP_VERSION = 2
+
+
+def get_rollup_collection(client, subject):
+    return client[subject][ROLLUP_COLLECTION]
+
+
+def accuracy(doc):
+    """Accuracy in percent; None for an attempt with no questions, which averages skip."""
+    return doc["score"] / doc["total"] * 100 if doc["total"] else None
+
+
+def category(value):
+    """The dashboard's performance category for one accuracy value; None outside (0, 100]."""
+    if value is None:
+        return None
+    for lower, upper, label in zip(CATEGORY_BINS, CATEGORY_BINS[1:], CATEGORY_LABELS):
+        if lower < value <= upper:
+            return label
+    return None
+
+
+def _attempt(doc):
+    return {"timestamp": doc["timestamp"], "accuracy": accuracy(doc), "score": doc["score"],
+            "total": doc["total"], "quiz_id": doc["quiz_id"]}
+
+
+def rollup_update(doc):
+    """Update applying one score document to its student's rollup."""
+    attempt = _attempt(doc)
+    value = attempt["accuracy"]
+    quiz = f"quizzes.{doc['quiz_id']}"
+    increments = {"attempts": 1, f"{quiz}.attempts": 1}
+    # Embedded documents compare field by field, so these keep the earliest
+    # attempt and each quiz's latest scored attempt whatever order scores arrive in
+    update = {
+        "$inc": increments,
+        "$min": {"first": {"timestamp": attempt["timestamp"], "accuracy": value}},
+        "$push": {"recent": {"$each": [attempt], "$sort": {"timestamp": 1}, "$slice": -RECENT_LIMIT}},
+        "$set": {"updated_at": datetime.utcnow()},
+        "$setOnInsert": {"version": ROLLUP_VERSION},
+    }
+    if value is not None:
+        below = value < SATISFACTORY_ACCURACY
+        increments.update({
+            "scored": 1,
+            "accuracy_sum": value,
+            f"{quiz}.scored": 1,
+            f"{quiz}.accuracy_sum": value,
+            f"{quiz}.below_attempts": int(below),
+            f"{quiz}.below_sum": value if below else 0.0,
+        })
+        label = category(value)
+        if label is not None:
+            increments[f"categories.{label}"] = 1
+        update["$max"] = {
+            f"{quiz}.best": value,
+            f"{quiz}.last": {"timestamp": attempt["timestamp"], "accuracy": value},
+        }
+    return update
+
+
+def apply(client, subject, docs):
+    """Fold newly written score documents into their students' rollups.
+
+    An update that creates a rollup has only seen the new scores, while the
+    student may have history from before rollups existed, so those students
+    are rebuilt from their full history.
+    """
+    if not docs:
+        return 0
+    ops = [UpdateOne({"_id": doc["student_id"]}, rollup_update(doc), upsert=True) for doc in docs]
+    result = get_rollup_collection(client, subject).bulk_write(ops, ordered=False)
+    for student_id in set(result.upserted_ids.values()):
+        rebuild(client, subject, student_id)
+    return len(ops)
+
+
+def _key(point):
+    # MongoDB orders null below every number
+    return point["timestamp"], float("-inf") if point["accuracy"] is None else point["accuracy"]
+
+
+def fold(student_id, docs):
+    """Rollup document for a student's full history; matches what rollup_update builds up."""
+    rollup = {
+        "_id": student_id, "version": ROLLUP_VERSION, "attempts": 0, "scored": 0, "accuracy_sum": 0.0,
+        "quizzes": {}, "categories": {}, "recent": [],
+    }
+    for doc in docs:
+        attempt = _attempt(doc)
+        value = attempt["accuracy"]
+        rollup["attempts"] += 1
+        point = {"timestamp": attempt["timestamp"], "accuracy": value}
+        if "first" not in rollup or _key(point) < _key(rollup["first"]):
+            rollup["first"] = point
+        rollup["recent"].append(attempt)
+
+        quiz = rollup["quizzes"].setdefault(doc["quiz_id"], {"attempts": 0})
+        quiz["attempts"] += 1
+        if value is None:
+            continue
+        rollup["scored"] += 1
+        rollup["accuracy_sum"] += value
+        quiz["scored"] = quiz.get("scored", 0) + 1
+        quiz["accuracy_sum"] = quiz.get("accuracy_sum", 0.0) + value
+        below = value < SATISFACTORY_ACCURACY
+        quiz["below_attempts"] = quiz.get("below_attempts", 0) + int(below)
+        quiz["below_sum"] = quiz.get("below_sum", 0.0) + (value if below else 0.0)
+        quiz["best"] = max(quiz.get("best", value), value)
+        if "last" not in quiz or _key(point) > _key(quiz["last"]):
+            quiz["last"] = point
+
+        label = category(value)
+        if label is not None:
+            rollup["categories"][label] = rollup["categories"].get(label, 0) + 1
+
+    rollup["recent"] = sorted(rollup["recent"], key=lambda a: a["timestamp"])[-RECENT_LIMIT:]
+    rollup["updated_at"] = datetime.utcnow()
+    return rollup
+
+
+def rebuild(client, subject, student_id=None):
+    """Recompute rollups from raw history for one student, or every student; returns how many were written.
+
+    Scores written while a rebuild runs may be counted twice or not at all;
+    run it when the subject is quiet, or rebuild that student again.
+    """
+    scores = client[subject][SCORES_COLLECTION]
+    rollups = get_rollup_collection(client, subject)
+    query = {} if student_id is None else {"student_id": student_id}
+    cursor = scores.find(
+        query, {"_id": 0, "student_id": 1, "quiz_id": 1, "score": 1, "total": 1, "timestamp": 1}
+    ).sort([("student_id", ASCENDING), ("timestamp", ASCENDING)])
+
+    written = 0
+    ops = []
+    for sid, docs in itertools.groupby(cursor, key=lambda doc: doc["student_id"]):
+        ops.append(ReplaceOne({"_id": sid}, fold(sid, docs), upsert=True))
+        if len(ops) >= REBUILD_BATCH:
+            rollups.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        rollups.bulk_write(ops, ordered=False)
+        written += len(ops)
+    if student_id is not None and not written:
+        rollups.delete_one({"_id": student_id})
+    return written
+
+
+def get_rollup(client, subject, student_id, writer=None):
+    """A student's rollup, built from history if it does not exist yet; None if they have no scores.
+
+    Pass the score writer so that a rebuild first waits for its in-flight
+    flush; otherwise scores it has inserted but not yet applied to the
+    rollup would be counted by the rebuild and then again by the writer.
+    """
+    rollup = get_rollup_collection(client, subject).find_one({"_id": student_id})
+    if rollup is not None and rollup.get("version") == ROLLUP_VERSION:
+        return rollup
+    if writer is not None:
+        writer.flush()
+    if not rebuild(client, subject, student_id):
+        return None
+    return get_rollup_collection(client, subject).find_one({"_id": student_id})
+
+
+def overview(rollup):
+    """Attempt count, date range, quizzes and latest attempt for the filter sidebar."""
+    latest = rollup["recent"][-1]
+    return {
+        "attempts": rollup["attempts"],
+        "first_attempt": rollup["first"]["timestamp"],
+        "last_attempt": latest["timestamp"],
+        "quizzes": sorted(rollup["quizzes"]),
+        "latest_score": latest["score"],
+        "latest_total": latest["total"],
+        "latest_accuracy": latest["accuracy"],
+    }
+
+
+def summary(rollup):
+    """Same fields as the summary from analysis_frames.summarize, over all attempts."""
+    recent = [attempt["accuracy"] for attempt in rollup["recent"][-RECENT_ATTEMPTS:]]
+    recent = [value for value in recent if value is not None]
+    return {
+        "attempts": rollup["attempts"],
+        "average": rollup["accuracy_sum"] / rollup["scored"] if rollup["scored"] else None,
+        "first_accuracy": rollup["first"]["accuracy"],
+        "last_accuracy": rollup["recent"][-1]["accuracy"],
+        "quiz_count": len(rollup["quizzes"]),
+        "recent_average": sum(recent) / len(recent) if recent else None,
+    }
+
+
+def quiz_stats(rollup):
+    """Same columns as the per-quiz frame from analysis_frames.summarize, plus each quiz's best."""
+    rows = [{
+        "quiz_id": quiz_id,
+        "attempts": quiz["attempts"],
+        "average": quiz["accuracy_sum"] / quiz["scored"] if quiz.get("scored") else None,
+        "last_accuracy": quiz["last"]["accuracy"] if "last" in quiz else None,
+        "below_attempts": quiz.get("below_attempts", 0),
+        "below_average": quiz["below_sum"] / quiz["below_attempts"] if quiz.get("below_attempts") else None,
+        "best": quiz.get("best"),
+    } for quiz_id, quiz in sorted(rollup["quizzes"].items())]
+    return pd.DataFrame(rows, columns=[
+        "quiz_id", "attempts", "average", "last_accuracy", "below_attempts", "below_average", "best"
+    ])
+
+
+if __name__ == "__main__":
+    import database
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python score_rollups.py <subject> [student_id]")
+    count = rebuild(database.get_client(), sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Rebuilt {count} rollup(s) in {sys.argv[1]}.{ROLLUP_COLLECTION}")
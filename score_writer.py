@@ -0,0 +1,265 @@
+"""Write-behind persistence for quiz scores.
+
+`submit()` appends the score document to a local append-only journal and
+returns immediately; a background thread flushes buffered documents to Mongo
+with `insert_many` once `SCORE_FLUSH_SIZE` documents are waiting or every
+`SCORE_FLUSH_INTERVAL` seconds. Journal segments are deleted only after
+their documents are written. Several processes can share the journal
+directory: each names its segments after an owner ID and holds an exclusive
+lock on `owner-<id>.lock` while it runs. On startup a writer replays only
+the segments whose owner's lock is free, i.e. whose process has exited.
+Documents get their `_id` before they are journaled, so a replay never
+creates duplicates.
+
+Each written document is then folded into its student's rollup (see
+`score_rollups`). Rollup updates are not retried, since a retry could count
+an attempt twice; `rollup_errors` counts failures, which `score_rollups.rebuild`
+repairs.
+"""
+import atexit
+import glob
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: other owners are never taken over
+    fcntl = None
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+import database
+import score_rollups
+
+DUPLICATE_KEY = 11000
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class ScoreWriter:
+    def __init__(self, client, journal_dir, flush_size=100, flush_interval=2.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self.flush_errors = 0
+        self.rollup_errors = 0
+        self.last_rollup_error = None
+        self._client = client
+        self._journal_dir = journal_dir
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._closed = False
+        self._retry_later = False
+        self._owner = f"{os.getpid()}_{uuid.uuid4().hex[:12]}"
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self._owner_lock = self._lock_file(self._lock_path(self._owner), block=True)
+        # One writer at a time takes over segments, so two never replay the same one
+        takeover_lock = self._lock_file(os.path.join(journal_dir, "takeover.lock"), block=True)
+        try:
+            orphans = self._orphaned_segments()
+            leftovers = self._read_segments(path for path, _ in orphans)
+            self._open_segment()
+            for subject, doc in leftovers:
+                self._journal_entry(subject, doc)
+            for path, _ in orphans:
+                os.remove(path)
+            for owner, lock in {owner: lock for _, (owner, lock) in orphans if lock is not None}.items():
+                os.remove(self._lock_path(owner))
+                lock.close()
+        finally:
+            takeover_lock.close()
+        self._pending.extend(leftovers)
+
+        self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Journal handling
+
+    def _open_segment(self):
+        self._journal_path = os.path.join(self._journal_dir, f"scores-{self._owner}-{time.time_ns()}.jsonl")
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def _journal_entry(self, subject, doc):
+        self._journal.write(json_util.dumps({"subject": subject, "doc": doc}) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self._journal_dir, "scores-*.jsonl")))
+
+    def _lock_path(self, owner):
+        return os.path.join(self._journal_dir, f"owner-{owner}.lock")
+
+    def _lock_file(self, path, block=False):
+        """Open path with an exclusive lock; None if another process holds it."""
+        f = open(path, "a")
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def _orphaned_segments(self):
+        """(path, (owner, lock)) for segments whose owner has exited; lock is held until they are replayed."""
+        owners = {}
+        orphans = []
+        for path in self._segment_paths():
+            # scores-<owner>-<time>.jsonl; segments from before owners existed have none
+            owner = os.path.basename(path)[len("scores-"):-len(".jsonl")].rpartition("-")[0]
+            if owner == self._owner:
+                continue
+            if owner not in owners:
+                if not owner or not os.path.exists(self._lock_path(owner)):
+                    owners[owner] = (owner, None)
+                elif fcntl is None:
+                    owners[owner] = None  # cannot tell whether it is alive, so leave it alone
+                else:
+                    lock = self._lock_file(self._lock_path(owner))
+                    owners[owner] = (owner, lock) if lock is not None else None
+            if owners[owner] is not None:
+                orphans.append((path, owners[owner]))
+        return orphans
+
+    def _read_segments(self, paths):
+        entries = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json_util.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash mid-append
+                    entries.append((entry["subject"], entry["doc"]))
+        return entries
+
+    # Public API
+
+    def submit(self, subject, doc):
+        """Journal a score document and queue it for the next flush."""
+        doc.setdefault("_id", ObjectId())
+        with self._cond:
+            self._journal_entry(subject, doc)
+            self._pending.append((subject, doc))
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify()
+        return doc["_id"]
+
+    def has_pending(self, subject, student_id):
+        with self._cond:
+            return any(s == subject and d.get("student_id") == student_id for s, d in self._pending)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """Write every buffered document; failed ones stay journaled and queued."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+                old_journal, old_path = self._journal, self._journal_path
+                self._open_segment()
+            old_journal.close()
+
+            failed = self._insert(batch)
+
+            with self._cond:
+                for subject, doc in failed:
+                    self._journal_entry(subject, doc)
+                self._pending[:0] = failed
+            os.remove(old_path)
+
+            self.flushed += len(batch) - len(failed)
+            return len(batch) - len(failed)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        return {
+            "pending": self.pending_count(),
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "rollup_errors": self.rollup_errors,
+            "last_rollup_error": self.last_rollup_error,
+        }
+
+    # Internals
+
+    def _insert(self, batch):
+        by_subject = {}
+        for subject, doc in batch:
+            by_subject.setdefault(subject, []).append(doc)
+
+        failed = []
+        for subject, docs in by_subject.items():
+            not_inserted = set()
+            try:
+                self._client[subject]["test_scores"].insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate keys mean a replayed document was already written
+                errors = e.details.get("writeErrors", [])
+                not_inserted = {err["index"] for err in errors}
+                bad = {err["index"] for err in errors if err.get("code") != DUPLICATE_KEY}
+                failed.extend((subject, docs[i]) for i in sorted(bad))
+                self.flush_errors += bool(bad)
+            except PyMongoError:
+                failed.extend((subject, doc) for doc in docs)
+                self.flush_errors += 1
+                continue
+            self._update_rollups(subject, [doc for i, doc in enumerate(docs) if i not in not_inserted])
+        return failed
+
+    def _update_rollups(self, subject, docs):
+        try:
+            score_rollups.apply(self._client, subject, docs)
+        except PyMongoError as e:
+            self.rollup_errors += 1
+            self.last_rollup_error = f"{subject}: {e}"
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and (self._retry_later or len(self._pending) < self.flush_size):
+                    self._cond.wait(timeout=self.flush_interval)
+                closed = self._closed
+            if closed:
+                return
+            errors_before = self.flush_errors
+            try:
+                self.flush()
+            except Exception:
+                self.flush_errors += 1
+            # Don't hammer an unreachable cluster with size-triggered retries
+            self._retry_later = self.flush_errors > errors_before
+
+
+def get_score_writer():
+    """Return the process-wide writer, replaying any leftover journal on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ScoreWriter(
+                    database.get_client(),
+                    os.getenv("SCORE_JOURNAL_DIR", ".score_journal"),
+                    flush_size=int(os.getenv("SCORE_FLUSH_SIZE", "100")),
+                    flush_interval=float(os.getenv("SCORE_FLUSH_INTERVAL", "2.0")),
+                )
+    return _writer
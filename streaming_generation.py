@@ -0,0 +1,77 @@
+"""Streamed flashcard generation that fills a deck while the model is still writing.
+
+A `StreamingGeneration` consumes the chat-completions stream on a background
+thread and appends each card to `flashcards` as soon as its JSON object is
+complete. The page keeps a reference to that list in session state, so the
+student can start on the first card while later ones are still arriving.
+An optional `card_dedup.CardFilter` drops near-duplicate cards as they arrive;
+`on_complete` still receives every card the model wrote.
+"""
+import threading
+import time
+
+import llm_gateway
+from flashcard_generation import MODEL, FlashcardStreamParser, build_document_prompt, estimate_tokens
+
+
+class StreamingGeneration:
+    def __init__(self, api_key, text, num_cards, on_complete=None, card_filter=None):
+        self.num_cards = num_cards
+        self.flashcards = []
+        self.done = False
+        self.error = None
+        self.first_card_seconds = None
+        self.total_seconds = None
+        self.prompt_tokens = None
+        self._api_key = api_key
+        self._text = text
+        self._on_complete = on_complete
+        self.card_filter = card_filter
+        self._generated = []
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="flashcard-stream", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            prompt, _ = build_document_prompt(self._text, self.num_cards)
+            self.prompt_tokens = estimate_tokens(prompt)
+            stream = llm_gateway.get_gateway().stream_chat_completion(
+                self._api_key,
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
+            parser = FlashcardStreamParser()
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                for card in parser.feed(delta):
+                    self._generated.append(card)
+                    if self.card_filter is not None:
+                        card = self.card_filter.accept(card)
+                        if card is None:
+                            continue
+                    if self.first_card_seconds is None:
+                        self.first_card_seconds = time.perf_counter() - self._started
+                    self.flashcards.append(card)
+
+            if not self._generated:
+                raise ValueError("The response did not contain any flashcards")
+            if self.card_filter is not None:
+                self.card_filter.commit()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.total_seconds = time.perf_counter() - self._started
+            self.done = True
+
+        if self.error is None and self._on_complete:
+            self._on_complete(list(self._generated), self.total_seconds)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def elapsed(self):
+        return self.total_seconds if self.done else time.perf_counter() - self._started
@@ -0,0 +1,90 @@
+"""Cache of extracted document text keyed by the SHA-256 of the uploaded bytes.
+
+Two tiers: a small in-process LRU shared by every session, and a gzip-compressed
+on-disk store that survives restarts. The disk tier is trimmed back under
+`TEXT_CACHE_DISK_MB` by evicting the least recently used files. Entries are
+also keyed by `EXTRACTOR_VERSION`, so text extracted by older code is never
+served after extraction changes.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from cache import TTLCache
+
+CACHE_DIR = os.getenv("TEXT_CACHE_DIR", ".text_cache")
+DISK_LIMIT_BYTES = int(os.getenv("TEXT_CACHE_DISK_MB", "512")) * 1024 * 1024
+# Bump whenever extracted text changes for the same file (2: PDF pages separated by form feeds)
+EXTRACTOR_VERSION = 2
+
+_memory = TTLCache(maxsize=int(os.getenv("TEXT_CACHE_MEMORY_ENTRIES", "64")), ttl=None)
+_disk_lock = threading.Lock()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _key(digest):
+    return f"{digest}-v{EXTRACTOR_VERSION}"
+
+
+def _path(digest):
+    return os.path.join(CACHE_DIR, f"{_key(digest)}.txt.gz")
+
+
+def get(digest):
+    """Return (text, tier) for a cached document, or (None, None) on a miss."""
+    text = _memory.get(_key(digest))
+    if text is not None:
+        return text, "memory"
+
+    path = _path(digest)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            text = f.read()
+    except (FileNotFoundError, OSError, EOFError):
+        return None, None
+
+    os.utime(path)  # mark as recently used for eviction
+    _memory.set(_key(digest), text)
+    return text, "disk"
+
+
+def put(digest, text):
+    _memory.set(_key(digest), text)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _path(digest)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    _evict_disk()
+
+
+def _evict_disk():
+    with _disk_lock:
+        entries = []
+        for name in os.listdir(CACHE_DIR):
+            if not name.endswith(".txt.gz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= DISK_LIMIT_BYTES:
+                break
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def stats():
+    return _memory.stats()
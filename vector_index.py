@@ -0,0 +1,264 @@
+"""Per-course vector index over uploaded course material.
+
+Documents are normalised and split into passages (the same blocks used for
+prompt packing), embedded on the CPU and appended to a per-course index under
+`VECTOR_INDEX_DIR/<course>/<backend>/`:
+
+* `vectors.f32`  - float32 unit vectors, row-major, memory-mapped for search;
+* `texts.bin`    - UTF-8 passage text, concatenated;
+* `offsets.i64`  - end offset of each passage in texts.bin;
+* `meta.json`    - committed row count and the documents already ingested.
+
+Appends write the data files first and meta.json last, so a crash mid-append
+leaves trailing bytes that are truncated on the next write.
+
+Embeddings come from sentence-transformers when `EMBEDDING_BACKEND` is set to
+`sentence-transformers` and the package is installed; otherwise a signed
+feature-hashing embedder (sublinear term frequency over unigrams and bigrams)
+is used, which needs no model download.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+import prompt_packing
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", ".vector_index")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+HASHING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+SEARCH_BLOCK_ROWS = 262144  # rows scored per matrix-vector product
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams and bigrams into `dim` buckets."""
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self._features = {}
+
+    def _feature(self, term):
+        feature = self._features.get(term)
+        if feature is None:
+            digest = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+            feature = (digest % self.dim, 1.0 if digest >> 63 else -1.0)
+            if len(self._features) < 500000:
+                self._features[term] = feature
+        return feature
+
+    def embed(self, texts):
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            words = [word for word in _TOKEN.findall(text.lower()) if word not in prompt_packing.STOPWORDS]
+            counts = {}
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                column, sign = self._feature(term)
+                rows.append(row)
+                columns.append(column)
+                values.append(sign * (1.0 + math.log(count)))
+
+        # Colliding features within a row are summed in one bincount pass
+        flat = np.array(rows, dtype=np.int64) * self.dim + np.array(columns, dtype=np.int64)
+        vectors = np.bincount(flat, weights=values, minlength=len(texts) * self.dim)
+        return _normalize(vectors.reshape(len(texts), self.dim).astype(np.float32))
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = "st-" + re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+    def embed(self, texts):
+        vectors = self._model.encode(list(texts), batch_size=64, convert_to_numpy=True)
+        return _normalize(vectors.astype(np.float32))
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                if EMBEDDING_BACKEND == "sentence-transformers" and SentenceTransformer is not None:
+                    _embedder = SentenceTransformerEmbedder()
+                else:
+                    _embedder = HashingEmbedder()
+    return _embedder
+
+
+def course_slug(course):
+    slug = re.sub(r"[^a-z0-9]+", "-", (course or "general").lower()).strip("-") or "general"
+    # Names that slug to the same string still get separate indexes
+    return f"{slug}-{hashlib.sha1((course or '').encode('utf-8')).hexdigest()[:8]}"
+
+
+class VectorIndex:
+    def __init__(self, path, embedder):
+        self.path = path
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._meta = self._read_meta()
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"count": 0, "text_bytes": 0, "dim": self.embedder.dim, "backend": self.embedder.name,
+                    "documents": {}}
+
+    def _write_meta(self):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file("meta.json"))
+
+    def _open(self):
+        count = self._meta["count"]
+        if count:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                      shape=(count, self._meta["dim"]))
+            self._offsets = np.memmap(self._file("offsets.i64"), dtype=np.int64, mode="r", shape=(count,))
+            self._texts = np.memmap(self._file("texts.bin"), dtype=np.uint8, mode="r",
+                                    shape=(self._meta["text_bytes"],))
+        else:
+            self._vectors = np.zeros((0, self._meta["dim"]), dtype=np.float32)
+            self._offsets = np.zeros(0, dtype=np.int64)
+            self._texts = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return self._meta["count"]
+
+    def has_document(self, digest):
+        return digest in self._meta["documents"]
+
+    def add_chunks(self, chunks, source, digest=None, vectors=None):
+        """Embed and append passages; returns the number of rows added."""
+        if not chunks:
+            return 0
+        if vectors is None:
+            vectors = self.embedder.embed(chunks)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        encoded = [chunk.encode("utf-8") for chunk in chunks]
+
+        with self._lock:
+            if digest is not None and digest in self._meta["documents"]:
+                return 0
+            count = self._meta["count"]
+            text_bytes = self._meta["text_bytes"]
+            offsets = text_bytes + np.cumsum([len(data) for data in encoded], dtype=np.int64)
+
+            # Truncate any uncommitted tail left by an interrupted append
+            for name, size, payload in (
+                ("vectors.f32", count * self._meta["dim"] * 4, vectors.tobytes()),
+                ("offsets.i64", count * 8, offsets.tobytes()),
+                ("texts.bin", text_bytes, b"".join(encoded)),
+            ):
+                with open(self._file(name), "ab") as f:
+                    f.truncate(size)
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            self._meta["count"] = count + len(chunks)
+            self._meta["text_bytes"] = int(offsets[-1])
+            if digest is not None:
+                self._meta["documents"][digest] = {"source": source, "rows": [count, count + len(chunks)]}
+            self._write_meta()
+            self._open()
+        return len(chunks)
+
+    def add_document(self, text, source, digest=None):
+        """Chunk, embed and index a document once; returns the number of passages added."""
+        digest = digest or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.has_document(digest):
+            return 0
+        chunks = prompt_packing.split_blocks(prompt_packing.normalize(text))
+        return self.add_chunks(chunks, source, digest)
+
+    def passage(self, row):
+        start = int(self._offsets[row - 1]) if row else 0
+        end = int(self._offsets[row])
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    def search_vector(self, query_vector, k=TOP_K):
+        """Return [(row, score)] for the k rows most similar to a unit query vector."""
+        vectors = self._vectors
+        count = len(vectors)
+        if not count:
+            return []
+        k = min(k, count)
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            scores = vectors[start:start + SEARCH_BLOCK_ROWS] @ query_vector
+            top = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if len(best_rows) > k:
+                keep = np.argpartition(best_scores, -k)[-k:]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores)
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order]
+
+    def search(self, query, k=TOP_K):
+        """Return [(score, passage)] for the k passages most relevant to query."""
+        query_vector = self.embedder.embed([query])[0]
+        return [(score, self.passage(row)) for row, score in self.search_vector(query_vector, k)]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(course):
+    embedder = get_embedder()
+    path = os.path.join(INDEX_DIR, course_slug(course), embedder.name)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = VectorIndex(path, embedder)
+        return _indexes[path]
+
+
+def retrieve_context(course, topic, k=TOP_K):
+    """Return (context_text, passages) with the top-k passages about topic, in index order."""
+    index = get_index(course)
+    query_vector = index.embedder.embed([topic])[0]
+    hits = sorted(index.search_vector(query_vector, k))  # row order keeps document flow
+    passages = [index.passage(row) for row, _ in hits]
+    return prompt_packing.BLOCK_SEPARATOR.join(passages), passages